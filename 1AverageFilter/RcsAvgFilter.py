@@ -1,19 +1,12 @@
-def calculate(z, m_prev, n):
-    # Moving average equations
-    alpha = (n - 1) / n
-    m_new = alpha * m_prev + (1 - alpha) * z
-    print(m_new)
-    return m_new
+import RecursiveFilter
 
 def filter(signal):
-    rolling_avg = []
-    n = 1
-    for z in signal:
-        print(n)
-        if n == 1:
-            m_prev = z
-        else:
-            m_prev = calculate(z, m_prev, n)
-        rolling_avg.append(m_prev)
-        n += 1
-    return rolling_avg
\ No newline at end of file
+    """
+    Average of all the samples so far, see RecursiveFilter.cumulative_average.
+    Args:
+        signal (np.ndarray): The signal to be averaged (shape: (n,) or (channels, n)).
+    Returns:
+        np.ndarray: The average after each sample (shape: (n,) or (channels, n)).
+    """
+    rolling_avg, _ = RecursiveFilter.cumulative_average(signal)
+    return rolling_avg
@@ -0,0 +1,82 @@
+import numpy as np
+import scipy.signal
+
+# First order recursive (IIR) filters y_k = b0 * x_k + b1 * x_{k-1} + a1 * y_{k-1}.
+# Signals can have several channels, time is along the last axis (shape: (T,) or (channels, T)).
+# Every filter takes and returns a state so a stream can be filtered in chunks,
+# filtering the chunks one after the other gives the same result as filtering the whole array at once.
+
+def first_order(signal, b0, b1, a1, state):
+    """
+    - Applies y_k = b0 * x_k + b1 * x_{k-1} + a1 * y_{k-1} using scipy.signal.lfilter.
+    Args:
+        signal (np.ndarray): The signal to be filtered (shape: (T,) or (channels, T)).
+        b0, b1, a1 (float): The filter coefficients.
+        state (tuple): (x_prev, y_prev) the input and output before the first sample (shape: () or (channels,)).
+    Returns:
+        np.ndarray: The filtered signal (same shape as signal).
+        tuple: (x_prev, y_prev) for the next chunk.
+    """
+    signal = np.asarray(signal, dtype=float)
+    x_prev, y_prev = state
+    if signal.shape[-1] == 0:
+        return signal.copy(), state
+    # lfilter stores the previous samples as a single value per channel (direct form II transposed)
+    zi = (b1 * np.asarray(x_prev, dtype=float) + a1 * np.asarray(y_prev, dtype=float))[..., np.newaxis]
+    filtered_signal, _ = scipy.signal.lfilter([b0, b1], [1, -a1], signal, zi=zi)
+    return filtered_signal, (signal[..., -1], filtered_signal[..., -1])
+
+def low_pass(signal, alpha, state = None):
+    """
+    - Exponential moving average low pass filter, y_k = alpha * y_{k-1} + (1 - alpha) * x_k.
+    Args:
+        signal (np.ndarray): The signal to be filtered (shape: (T,) or (channels, T)).
+        alpha (float): The smoothing factor determines how quickly weightings of previous terms decay (exponentially).
+        state (tuple, optional): State returned by the previous chunk. Defaults to None which starts from the first sample.
+    Returns:
+        np.ndarray: The filtered signal (same shape as signal).
+        tuple: The state for the next chunk.
+    """
+    signal = np.asarray(signal, dtype=float)
+    if state is None:
+        state = (signal[..., 0], signal[..., 0])
+    return first_order(signal, 1 - alpha, 0, alpha, state)
+
+def high_pass(signal, alpha, state = None):
+    """
+    - Exponential moving average high pass filter, y_k = alpha * (y_{k-1} + x_k - x_{k-1}).
+    Args:
+        signal (np.ndarray): The signal to be filtered (shape: (T,) or (channels, T)).
+        alpha (float): The smoothing factor determines how quickly weightings of previous terms decay (exponentially).
+        state (tuple, optional): State returned by the previous chunk. Defaults to None, the first sample is passed through
+                                 unfiltered and used as the starting point.
+    Returns:
+        np.ndarray: The filtered signal (same shape as signal).
+        tuple: The state for the next chunk.
+    """
+    signal = np.asarray(signal, dtype=float)
+    if state is None:
+        if signal.shape[-1] == 0:
+            return signal.copy(), None
+        rest, state = first_order(signal[..., 1:], alpha, -alpha, alpha, (signal[..., 0], signal[..., 0]))
+        return np.concatenate([signal[..., :1], rest], axis=-1), state
+    return first_order(signal, alpha, -alpha, alpha, state)
+
+def cumulative_average(signal, state = None):
+    """
+    - Average of all the samples so far, m_k = ((k - 1) / k) * m_{k-1} + x_k / k.
+    - alpha = (k - 1) / k changes every sample so this uses a cumulative sum rather than lfilter.
+    Args:
+        signal (np.ndarray): The signal to be averaged (shape: (T,) or (channels, T)).
+        state (tuple, optional): (count, mean) returned by the previous chunk. Defaults to None which starts from nothing.
+    Returns:
+        np.ndarray: The average after each sample (same shape as signal).
+        tuple: (count, mean) for the next chunk.
+    """
+    signal = np.asarray(signal, dtype=float)
+    count, mean = (0, 0.0) if state is None else state
+    if signal.shape[-1] == 0:
+        return signal.copy(), (count, mean)
+    counts = count + np.arange(1, signal.shape[-1] + 1)
+    averages = (count * np.asarray(mean, dtype=float)[..., np.newaxis] + np.cumsum(signal, axis=-1)) / counts
+    return averages, (counts[-1], averages[..., -1])
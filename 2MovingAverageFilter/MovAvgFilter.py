@@ -1,17 +1,13 @@
-import numpy as np
+import MovingAverage
 
-def filter_signal(signal, window, moving_averages=[]):
-    k = len(moving_averages) + window
-    
-    if moving_averages == []:
-        average_new = signal[:window].mean()
-        
-    elif k < len(signal):
-        average_prev = moving_averages[-1]
-        average_new = average_prev + (signal[k] - signal[k - window]) / window
-    
-    else:
-        return np.arange(window, k, 1), moving_averages
-    
-    moving_averages.append(average_new)
-    return filter_signal(signal, window, moving_averages)
\ No newline at end of file
+def filter_signal(signal, window):
+    """
+    Trailing moving average of the signal, see MovingAverage.moving_average.
+    Args:
+        signal (np.ndarray): The signal to be averaged (shape: (n,) or (channels, n)).
+        window (int): Number of samples in each window.
+    Returns:
+        np.ndarray: The index of the last sample in each window (shape: (n - window + 1,)).
+        np.ndarray: The moving averages (shape: (n - window + 1,) or (channels, n - window + 1)).
+    """
+    return MovingAverage.moving_average(signal, window)
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Moving averages over a fixed window of samples.
+# Signals can have several channels, time is along the last axis (shape: (T,) or (channels, T)).
+# Each average is labelled with the index of the sample it belongs to:
+#   - trailing: the last sample in the window, so the first average is at index window - 1
+#   - centered: the middle sample in the window (the later of the two middle samples for an even window)
+
+def offset(window, centered = False):
+    """
+    Number of samples between the end of a window and the sample its average belongs to.
+    """
+    return window // 2 if centered else 0
+
+def moving_average(signal, window, centered = False):
+    """
+    - Moving average of every complete window using a cumulative sum, O(T) for any window size.
+    Args:
+        signal (np.ndarray): The signal to be averaged (shape: (T,) or (channels, T)).
+        window (int): Number of samples in each window.
+        centered (bool): Whether each average belongs to the middle of its window rather than the end. Defaults to False.
+    Returns:
+        np.ndarray: The index of the sample each average belongs to (shape: (T - window + 1,)).
+        np.ndarray: The averages (shape: (T - window + 1,) or (channels, T - window + 1)).
+    """
+    signal = np.asarray(signal, dtype=float)
+    n = signal.shape[-1]
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if n < window:
+        return np.arange(0), signal[..., :0].copy()
+    sums = np.zeros(signal.shape[:-1] + (n + 1,))
+    np.cumsum(signal, axis=-1, out=sums[..., 1:])
+    averages = (sums[..., window:] - sums[..., :-window]) / window
+    indices = np.arange(window - 1, n) - offset(window, centered)
+    return indices, averages
+
+class MovingAverage:
+    """
+    - Moving average of a live stream, the samples can be pushed in one at a time (update) or in chunks (filter).
+    - Only the last window samples are kept in a ring buffer along with their running sum,
+      so the memory used doesn't grow with the length of the stream.
+    - Gives the same averages as moving_average on the whole signal.
+    """
+    def __init__(self, window, channels = None, centered = False):
+        """
+        Args:
+            window (int): Number of samples in each window.
+            channels (int, optional): Number of channels. Defaults to None for a single channel signal of shape (T,).
+            centered (bool): Whether each average belongs to the middle of its window rather than the end. Defaults to False.
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.centered = centered
+        shape = () if channels is None else (channels,)
+        self.buffer = np.zeros(shape + (window,))  # Ring buffer of the last window samples
+        self.sum = np.zeros(shape)  # Sum of the samples in the buffer
+        self.count = 0  # Number of samples seen so far
+
+    def update(self, x):
+        """
+        - Adds one sample to the stream.
+        Args:
+            x (float or np.ndarray): The new sample (shape: () or (channels,)).
+        Returns:
+            int: The index of the sample the average belongs to, None until the first window is full.
+            np.ndarray: The average, None until the first window is full.
+        """
+        position = self.count % self.window
+        if self.count >= self.window:
+            self.sum -= self.buffer[..., position]
+        self.buffer[..., position] = x
+        self.sum += self.buffer[..., position]
+        self.count += 1
+        if position == self.window - 1:
+            # Recalculate the sum once per lap of the buffer so rounding errors don't build up
+            self.sum = self.buffer.sum(axis=-1)
+        if self.count < self.window:
+            return None, None
+        return self.count - 1 - offset(self.window, self.centered), self.sum / self.window
+
+    def _history(self):
+        """
+        The last window - 1 samples (or fewer at the start of the stream) in order.
+        """
+        h = min(self.count, self.window - 1)
+        positions = (self.count - h + np.arange(h)) % self.window
+        return self.buffer[..., positions]
+
+    def filter(self, signal):
+        """
+        - Adds a chunk of samples to the stream, vectorised with moving_average.
+        Args:
+            signal (np.ndarray): The new samples (shape: (T,) or (channels, T)).
+        Returns:
+            np.ndarray: The index of the sample each average belongs to.
+            np.ndarray: The averages of every window which ends in this chunk.
+        """
+        signal = np.asarray(signal, dtype=float)
+        history = self._history()
+        indices, averages = moving_average(np.concatenate([history, signal], axis=-1), self.window, self.centered)
+        indices += self.count - history.shape[-1]
+
+        # Keep the last window samples
+        n = signal.shape[-1]
+        k = min(n, self.window)
+        positions = (self.count + n - k + np.arange(k)) % self.window
+        self.buffer[..., positions] = signal[..., n - k:]
+        self.count += n
+        self.sum = self.buffer.sum(axis=-1)  # Slots which haven't been filled yet are still zero
+        return indices, averages
@@ -1,4 +1,7 @@
 import numpy as np
+import scipy.linalg
+import scipy.signal
+from functools import lru_cache
 
 def calcualte(x, p, z, A, H, Q, R):
     # Predict state error
@@ -11,7 +14,9 @@ def calcualte(x, p, z, A, H, Q, R):
     P_e = P_p - K_k@H@P_p
     return x_e, P_e
 
-def filter(signal, x_i, p_i, **kwargs):
+def filter(signal, x_i, p_i, steady_state = False, tol = 1e-6, **kwargs):
+    if steady_state:
+        return filter_steady_state(signal, x_i, p_i, tol=tol, **kwargs)
     x = x_i
     p = p_i
     filtered_signal = []
@@ -21,5 +26,129 @@ def filter(signal, x_i, p_i, **kwargs):
         filtered_signal.append(x)
     
     return np.array(filtered_signal)
+
+def _key(M):
+    # Arrays aren't hashable so the cache is keyed on their shape and values instead
+    M = np.atleast_2d(np.asarray(M, dtype=float))
+    return M.shape, tuple(M.ravel())
+
+@lru_cache(maxsize=32)
+def _solve_steady_state(A_key, H_key, Q_key, R_key):
+    A, H, Q, R = (np.array(values).reshape(shape) for shape, values in (A_key, H_key, Q_key, R_key))
+    # The predicted covariance solves the discrete algebraic Riccati equation
+    P_p = scipy.linalg.solve_discrete_are(A.T, H.T, Q, R)
+    K = P_p @ H.T @ np.linalg.inv(H @ P_p @ H.T + R)
+    P_e = P_p - K @ H @ P_p
+    return K, P_e
+
+def steady_state_gain(A, H, Q, R):
+    """
+    Solves for the kalman gain and error covariance the filter converges to when A, H, Q and R are constant.
+    Results are cached on the parameter values so repeated runs only solve the Riccati equation once.
+    Args:
+        A (np.ndarray): State transition matrix (shape: (s, s)).
+        H (np.ndarray): Measurement to state matrix (shape: (m, s)).
+        Q (np.ndarray): Process noise covariance matrix (shape: (s, s)).
+        R (np.ndarray): Measurement noise covariance matrix (shape: (m, m)) or a float when m = 1.
+    Returns:
+        K (np.ndarray): Steady state kalman gain (shape: (s, m)).
+        P_e (np.ndarray): Steady state error covariance after correction (shape: (s, s)).
+    """
+    K, P_e = _solve_steady_state(_key(A), _key(H), _key(Q), _key(R))
+    return K.copy(), P_e.copy()
+
+def fixed_gain_recurrence(F, ws, x_start):
+    """
+    Runs x_k = F @ x_{k-1} + w_k over every row of ws without a python loop.
+    Each state is written as a transfer function of each input and evaluated with scipy.signal.lfilter.
+    Args:
+        F (np.ndarray): Constant transition matrix of the recurrence (shape: (s, s)).
+        ws (np.ndarray): Input added at each step (shape: (T, s)).
+        x_start (np.ndarray): State before the first step (shape: (s,)).
+    Returns:
+        np.ndarray: The states after each step (shape: (T, s)).
+    """
+    n_states = F.shape[0]
+    ws = np.array(ws, dtype=float)
+    # The starting state enters as an extra input on the first step
+    ws[0] += F @ x_start
+    xs = np.zeros_like(ws)
+    identity = np.eye(n_states)
+    for j in range(n_states):
+        # Transfer function (I - F z^-1)^-1 from input j to every state
+        num, den = scipy.signal.ss2tf(F, F, identity, identity, input=j)
+        for i in range(n_states):
+            xs[:, i] += scipy.signal.lfilter(num[i], den, ws[:, j])
+    return xs
+
+def filter_steady_state(signal, x_i, p_i, A, H, Q, R, tol = 1e-6):
+    """
+    Same as filter but switches to the steady state gain once the error covariance has converged.
+    After the switch the filter is a fixed linear recurrence which is evaluated in one vectorised pass.
+    Args:
+        signal (np.ndarray): Measurements (shape: (T,) or (T, m)).
+        x_i (np.ndarray): Initial state vector (shape: (s,)).
+        p_i (np.ndarray): Initial error covariance matrix (shape: (s, s)).
+        A, H, Q, R: Kalman filter parameters, see filter_batch.
+        tol (float): Largest relative difference between P and its steady state value before switching.
+    Returns:
+        np.ndarray: Filtered states (shape: (T, s)).
+    """
+    K_ss, P_ss = steady_state_gain(A, H, Q, R)
+    n = len(signal)
+    filtered_signal = np.empty((n, A.shape[0]))
+    x = x_i
+    p = p_i
+    
+    # Normal kalman filter until P is close to its steady state value
+    k = 0
+    while k < n and np.abs(p - P_ss).max() > tol * np.abs(P_ss).max():
+        x, p = calcualte(x, p, signal[k], A, H, Q, R)
+        filtered_signal[k] = x
+        k += 1
+    
+    if k < n:
+        # x_k = (I - K H) A x_{k-1} + K z_k
+        F = (np.eye(A.shape[0]) - K_ss @ H) @ A
+        zs = np.asarray(signal[k:], dtype=float).reshape(n - k, -1)
+        filtered_signal[k:] = fixed_gain_recurrence(F, zs @ K_ss.T, x)
+    return filtered_signal
+
+def filter_batch(signals, x_i, p_i, A, H, Q, R):
+    """
+    Runs the same Kalman filter as filter over many channels at once.
+    Every channel is moved forward together using stacked matrices, so the python loop only runs once per sample.
+    Args:
+        signals (np.ndarray): Measurements for each channel (shape: (N, T) or (N, T, m)).
+        x_i (np.ndarray): Initial state vector, shared (shape: (s,)) or per channel (shape: (N, s)).
+        p_i (np.ndarray): Initial error covariance, shared (shape: (s, s)) or per channel (shape: (N, s, s)).
+        A (np.ndarray): State transition matrix (shape: (s, s)).
+        H (np.ndarray): Measurement to state matrix (shape: (m, s)).
+        Q (np.ndarray): Process noise covariance matrix (shape: (s, s)).
+        R (np.ndarray): Measurement noise covariance matrix (shape: (m, m)) or a float when m = 1.
+    Returns:
+        np.ndarray: Filtered states for each channel (shape: (N, T, s)).
+    """
+    signals = np.asarray(signals, dtype=float)
+    n_channels, n_samples = signals.shape[:2]
+    n_states = A.shape[0]
+    zs = signals.reshape(n_channels, n_samples, -1)  # shape (N, T, m)
+    
+    # Copies of the initial conditions, one for each channel
+    x = np.array(np.broadcast_to(x_i, (n_channels, n_states)), dtype=float)
+    p = np.array(np.broadcast_to(p_i, (n_channels, n_states, n_states)), dtype=float)
+    R = np.atleast_2d(R)
+    filtered_signals = np.empty((n_channels, n_samples, n_states))
+    
+    for k in range(n_samples):
+        # Predict state error
+        x_p = np.einsum('ij,nj->ni', A, x)
+        P_p = A @ p @ A.T + Q
+        
+        # Predict kalman gain
+        K_k = P_p @ H.T @ np.linalg.inv(H @ P_p @ H.T + R)
+        x = x_p + np.einsum('nij,nj->ni', K_k, zs[:, k] - np.einsum('ij,nj->ni', H, x_p))
+        p = P_p - K_k @ H @ P_p
+        filtered_signals[:, k] = x
     
-    
\ No newline at end of file
+    return filtered_signals
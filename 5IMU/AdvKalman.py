@@ -1,6 +1,8 @@
 import numpy as np
 import scipy.constants as sc
 
+import Quaternion
+
 def calcualte(x, p, z, A, H, Q, R):
     """
     Mathematics for correcting the state using a Kalman filter.
@@ -36,11 +38,8 @@ def EP2euler(beta):
         np.ndarray: Euler angles in the order [psi, theta, phi].
                    psi is the yaw angle, theta is the pitch angle, phi is the roll angle.
     """
-    q0, q1, q2, q3 = beta
-    phi = np.arctan2(2*(q1*q2+q0*q3),q0*q0+q1*q1-q2*q2-q3*q3)
-    theta = np.arcsin(-2*(q1*q3-q0*q2))
-    psi = np.arctan2(2*(q2*q3+q0*q1),q0*q0-q1*q1-q2*q2+q3*q3)
-    return np.array([psi, theta, phi])
+    # Quaternion.to_euler gives [yaw, pitch, roll], this function has always returned them the other way round
+    return Quaternion.to_euler(beta)[..., ::-1]
 
 def euler2EP(euler_angles):
     """
@@ -51,12 +50,7 @@ def euler2EP(euler_angles):
     Returns:
         np.ndarray: Euler parameters (EP) in the order [q0, q1, q2, q3].
     """
-    psi, theta, phi = euler_angles
-    q0 = np.cos(phi/2) * np.cos(theta/2) * np.cos(psi/2) + np.sin(phi/2) * np.sin(theta/2) * np.sin(psi/2)
-    q1 = np.sin(phi/2) * np.cos(theta/2) * np.cos(psi/2) - np.cos(phi/2) * np.sin(theta/2) * np.sin(psi/2)
-    q2 = np.cos(phi/2) * np.sin(theta/2) * np.cos(psi/2) + np.sin(phi/2) * np.cos(theta/2) * np.sin(psi/2)
-    q3 = np.cos(phi/2) * np.cos(theta/2) * np.sin(psi/2) - np.sin(phi/2) * np.sin(theta/2) * np.cos(psi/2)
-    return np.array([q0, q1, q2, q3])
+    return Quaternion.from_euler(euler_angles, intrinsic=True)
 
 def a2euler(as_):
     """
@@ -83,6 +77,7 @@ def filter_no_fusion(ws, x_i, p_i, dt, **kwargs):
     """
     n = len(ws)
     filtered_signal = np.zeros((n, 3))
+    quats = np.empty((n, 4))
     x = x_i.copy()
     p = p_i.copy()
     
@@ -96,8 +91,10 @@ def filter_no_fusion(ws, x_i, p_i, dt, **kwargs):
         ])
         A = np.eye(4) + dt * B
         x, p = calcualte(x, p, x, A, **kwargs)
-        
-        filtered_signal[i] = EP2euler(x)
+        quats[i] = x
+    
+    # The first row is left as zeros
+    filtered_signal[1:] = EP2euler(quats[1:])
     return filtered_signal
 
 def filter(as_, ws, x_i, p_i, dt, **kwargs):
@@ -120,12 +117,12 @@ def filter(as_, ws, x_i, p_i, dt, **kwargs):
                    Each row corresponds to [psi, theta, phi] angles.
     """
     n = len(ws)
-    filtered_signal = np.zeros((n, 3))
+    quats = np.empty((n, 4))
     x = x_i.copy()
     p = p_i.copy()
     eulers = a2euler(as_).T  # shape (n, 3)
     
-    zs = np.apply_along_axis(euler2EP, 1, eulers)  # shape (n, 4)
+    zs = euler2EP(eulers)  # shape (n, 4)
     for i in range(n):
         w_1, w_2, w_3 = ws[i]
         B = 0.5 * np.array([
@@ -136,7 +133,8 @@ def filter(as_, ws, x_i, p_i, dt, **kwargs):
         ])
         A = np.eye(4) + dt * B
         x, p = calcualte(x, p, zs[i], A, **kwargs)
-        filtered_signal[i] = EP2euler(x)
+        quats[i] = x
+    filtered_signal = EP2euler(quats)
     return filtered_signal
     
     
\ No newline at end of file
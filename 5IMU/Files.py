@@ -0,0 +1,35 @@
+import json
+import os
+
+# Helpers shared by the modules which cache what they read or calculate, e.g. the .npy caches and the results cache.
+# A cache made from a file is checked against the file's fingerprint, its size and modification time, and is rebuilt
+# whenever either changes. Cache files are written with atomic_write, see below.
+
+def fingerprint(path):
+    """
+    Returns:
+        dict: The file's size and modification time, a stand in for its contents.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def atomic_write(path, write, binary = True):
+    """
+    - Writes a file by calling write with a temporary file next to it, which then replaces path with os.replace.
+    - A file left half written by an interrupted run is never read, and arrays memory mapped from the old file
+      keep its contents since it is replaced rather than truncated.
+    Args:
+        path (str): Path to the file.
+        write (callable): Called with the open temporary file e.g. lambda f: np.save(f, values).
+        binary (bool): Whether the file is opened in binary mode. Defaults to True.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb" if binary else "w") as f:
+        write(f)
+    os.replace(tmp, path)
+
+def write_json(path, value, **kwargs):
+    """
+    Writes value as json with atomic_write, kwargs are passed to json.dump e.g. indent.
+    """
+    atomic_write(path, lambda f: json.dump(value, f, **kwargs), binary=False)
@@ -1,5 +1,7 @@
 import numpy as np
 
+import Quaternion
+
 def T(euler_angles):
     """
     Calculates the transformation matrix T which determines the time derivative of the euler angles.
@@ -34,3 +36,26 @@ def integrate(omegas, dt, eulers_initial=np.array([0, 0, 0])):
         eulers.append(new_euler_angles)
     return np.array(eulers[:-1]) # Exclude the last element to match the length of omegas
 
+def integrate_scan(omegas, dt, eulers_initial=np.array([0, 0, 0]), processes=None):
+    """
+    - Drop in replacement for integrate which integrates in quaternions instead of euler angles.
+    - Each angular velocity is turned into the rotation over its time step, all at once, and the rotations
+      are combined with Quaternion.cumulative_product, so there is no python loop and no singularity at theta = ±pi/2.
+    - Each step is the exact rotation rather than a first order step, so the result differs from integrate by O(dt).
+    Args:
+        omegas (np.ndarray): Angular velocities in the order [omega_x, omega_y, omega_z] (shape: (n, 3)).
+        dt (float): Time step for integration.
+        eulers_initial (np.ndarray): Initial euler angles in the order [psi, theta, phi] (shape: (3,)).
+        processes (int, optional): Number of worker processes for very long logs, see Quaternion.cumulative_product.
+    Returns:
+        np.ndarray: Integrated euler angles in the order [psi, theta, phi] (shape: (n, 3)).
+    """
+    omegas = np.asarray(omegas, dtype=float)
+    if len(omegas) == 0:
+        return np.empty((0, 3))
+    # Rotation over each time step, the first row is the initial orientation
+    rotations = np.empty((len(omegas), 4))
+    rotations[0] = Quaternion.from_euler(eulers_initial, intrinsic=True)
+    rotations[1:] = Quaternion.exp(omegas[:-1] * (dt / 2))
+    quats = Quaternion.cumulative_product(rotations, processes=processes)
+    return Quaternion.to_euler(quats)
@@ -1,10 +1,10 @@
+import ArsData
 import Integrate
 import AdvKalman
 
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider
 import numpy as np
-import pandas as pd
 import time
 
 
@@ -34,27 +34,12 @@ R = np.identity(4) * r
 p_i = np.identity(4) * p  # initial covariance matrix
 
 
-# For reading gyroscope data from ArsGyro.json
-df = pd.read_json('Data/ArsGyro.json')
-data = df["data"]
+# Gyroscope and accelerometer data from ArsGyro.json and ArsAccel.json, cached as .npy after the first run
+ws_ = ArsData.read_gyro('Data')
+w_1, w_2, w_3 = ws_.T
 
-data_df = pd.DataFrame(data)
-
-w_1 = np.array(data_df.loc["wx", "data"])
-w_2 = np.array(data_df.loc["wy", "data"])
-w_3 = np.array(data_df.loc["wz", "data"])
-ws_ = np.column_stack((w_1, w_2, w_3)) 
-
-# For reading accelerometer data from ArsAccel.json
-df = pd.read_json('Data/ArsAccel.json')
-data = df["data"]
-
-data_df = pd.DataFrame(data)
-
-a_1 = np.array(data_df.loc["fx", "data"])
-a_2 = np.array(data_df.loc["fy", "data"])
-a_3 = np.array(data_df.loc["fz", "data"])
-as__ = np.column_stack((a_1, a_2, a_3))
+as__ = ArsData.read_accel('Data')
+a_1, a_2, a_3 = as__.T
 
 def run(Q, R, p_i, additional_noise_w = 0, additional_noise_a = 0):
     """
@@ -83,9 +68,9 @@ def run(Q, R, p_i, additional_noise_w = 0, additional_noise_a = 0):
     ws = ws_ + rng.normal(0, additional_noise_w, (len(w_1), 3))
     t_w = np.arange(0, len(w_1) * dt, dt)
 
-    # Calculate the euler angles using euler integration
+    # Calculate the euler angles by integrating the gyroscope in quaternions (a prefix scan of the rotation over each step)
     start_time = time.perf_counter()
-    eulers_g = Integrate.integrate(ws, dt=0.01, eulers_initial=np.array([0, 0, 0]))
+    eulers_g = Integrate.integrate_scan(ws, dt=0.01, eulers_initial=np.array([0, 0, 0]))
     end_time = time.perf_counter()
     integrate_time = end_time - start_time
     
@@ -178,7 +163,7 @@ ax12.set_ylabel('$\psi$')
 ax12.set_xlabel('$t$')
 
 
-# Plot yaw pitch roll using euler integration
+# Plot yaw pitch roll from quaternion integration of the gyroscope
 fig3, (ax7, ax8, ax9) = plt.subplots(3, 1, figsize=figsize, sharex=True)
 alpha = 0.8
 ax7.plot(t_w, phi_g, label='$\phi^-$', color='green', alpha=alpha)
@@ -200,17 +185,17 @@ ax9.set_xlabel('$t$')
 #ax9.hlines(0, t_w.min(), t_w.max(), color='black', linestyle='--')
 ax9.legend()
 
-# Compare euler integration with kalman filter (no fusion) 
+# Compare quaternion integration with kalman filter (no fusion) 
 fig8, axs = plt.subplots(3, 2, figsize=figsize, sharex=True)
-axs[0,0].plot(t_w, phi_g, label='Euler Method', color='green', alpha=alpha)
+axs[0,0].plot(t_w, phi_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[0,0].set_ylabel('$\phi$')
 axs[0,1].plot(t_w, phi_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
 
-axs[1,0].plot(t_w, theta_g, label='Euler Method', color='green', alpha=alpha)
+axs[1,0].plot(t_w, theta_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[1,0].set_ylabel('$\\theta$')
 axs[1,1].plot(t_w, theta_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
 
-axs[2,0].plot(t_w, psi_g, label='Euler Method', color='green', alpha=alpha)
+axs[2,0].plot(t_w, psi_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[2,0].set_ylabel('$\psi$')
 axs[2,0].set_xlabel('$t$')
 axs[2,1].plot(t_w, psi_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
@@ -241,17 +226,17 @@ ax12.set_xlabel('$t$')
 # Compare all three filters
 alpha = 0.8
 fig7, axs = plt.subplots(3, 3, figsize=figsize, sharex=True, sharey=True)
-axs[0,0].plot(t_w, phi_g, label='Euler Method', color='green', alpha=alpha)
+axs[0,0].plot(t_w, phi_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[0,0].set_ylabel('$\phi$')
 axs[0,1].plot(t_w, phi_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
 axs[0,2].plot(t_w, phi_f, label='Kalman Filter (with fusion)', color='yellow', alpha=alpha)
 
-axs[1,0].plot(t_w, theta_g, label='Euler Method', color='green', alpha=alpha)
+axs[1,0].plot(t_w, theta_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[1,0].set_ylabel('$\\theta$')
 axs[1,1].plot(t_w, theta_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
 axs[1,2].plot(t_w, theta_f, label='Kalman Filter (with fusion)', color='yellow', alpha=alpha)
 
-axs[2,0].plot(t_w, psi_g, label='Euler Method', color='green', alpha=alpha)
+axs[2,0].plot(t_w, psi_g, label='Quaternion Integration', color='green', alpha=alpha)
 axs[2,0].set_ylabel('$\psi$')
 axs[2,0].set_xlabel('$t$')
 axs[2,1].plot(t_w, psi_n, label='Kalman Filter (no fusion)', color='blue', alpha=alpha)
@@ -1,4 +1,7 @@
 import numpy as np
+import scipy.linalg
+import scipy.signal
+from functools import lru_cache
 
 def calcualte(x, u, p, z, A, B, H, Q, R, R_u):
     """
@@ -28,7 +31,9 @@ def calcualte(x, u, p, z, A, B, H, Q, R, R_u):
     P_e = P_p - K_k@H@P_p
     return x_e, P_e
 
-def filter(signal, us, x_i, p_i, **kwargs):
+def filter(signal, us, x_i, p_i, steady_state = False, tol = 1e-6, **kwargs):
+    if steady_state:
+        return filter_steady_state(signal, us, x_i, p_i, tol=tol, **kwargs)
     x = x_i
     p = p_i
     filtered_signal = []
@@ -37,6 +42,95 @@ def filter(signal, us, x_i, p_i, **kwargs):
         filtered_signal.append(x)       
     return np.array(filtered_signal)
 
+def _key(M):
+    # Arrays aren't hashable so the cache is keyed on their shape and values instead
+    M = np.atleast_2d(np.asarray(M, dtype=float))
+    return M.shape, tuple(M.ravel())
+
+@lru_cache(maxsize=32)
+def _solve_steady_state(A_key, B_key, H_key, Q_key, R_key, R_u_key):
+    A, B, H, Q, R, R_u = (np.array(values).reshape(shape) for shape, values in (A_key, B_key, H_key, Q_key, R_key, R_u_key))
+    # The control input noise acts as extra process noise
+    Q_u = B*R_u*B.T + Q
+    # The predicted covariance solves the discrete algebraic Riccati equation
+    P_p = scipy.linalg.solve_discrete_are(A.T, H.T, Q_u, R)
+    K = P_p@H.T@np.linalg.inv(H@P_p@H.T+R)
+    P_e = P_p - K@H@P_p
+    return K, P_e
+
+def steady_state_gain(A, B, H, Q, R, R_u):
+    """
+    Solves for the kalman gain and error covariance the filter converges to when the parameters are constant.
+    Results are cached on the parameter values so repeated runs only solve the Riccati equation once.
+    Args:
+        A, B, H, Q, R, R_u: Kalman filter parameters, see calcualte.
+    Returns:
+        K (np.ndarray): Steady state kalman gain (shape: (2, 1)).
+        P_e (np.ndarray): Steady state error covariance after correction (shape: (2, 2)).
+    """
+    K, P_e = _solve_steady_state(_key(A), _key(B), _key(H), _key(Q), _key(R), _key(R_u))
+    return K.copy(), P_e.copy()
+
+def fixed_gain_recurrence(F, ws, x_start):
+    """
+    Runs x_k = F @ x_{k-1} + w_k over every row of ws without a python loop.
+    Each state is written as a transfer function of each input and evaluated with scipy.signal.lfilter.
+    Args:
+        F (np.ndarray): Constant transition matrix of the recurrence (shape: (s, s)).
+        ws (np.ndarray): Input added at each step (shape: (T, s)).
+        x_start (np.ndarray): State before the first step (shape: (s,)).
+    Returns:
+        np.ndarray: The states after each step (shape: (T, s)).
+    """
+    n_states = F.shape[0]
+    ws = np.array(ws, dtype=float)
+    # The starting state enters as an extra input on the first step
+    ws[0] += F @ x_start
+    xs = np.zeros_like(ws)
+    identity = np.eye(n_states)
+    for j in range(n_states):
+        # Transfer function (I - F z^-1)^-1 from input j to every state
+        num, den = scipy.signal.ss2tf(F, F, identity, identity, input=j)
+        for i in range(n_states):
+            xs[:, i] += scipy.signal.lfilter(num[i], den, ws[:, j])
+    return xs
+
+def filter_steady_state(signal, us, x_i, p_i, A, B, H, Q, R, R_u, tol = 1e-6):
+    """
+    Same as filter but switches to the steady state gain once the error covariance has converged.
+    After the switch the filter is a fixed linear recurrence which is evaluated in one vectorised pass.
+    Args:
+        signal (np.ndarray): Position measurements (shape: (T,)).
+        us (np.ndarray): Control inputs i.e. acceleration measurements (shape: (T,)).
+        x_i (np.ndarray): Initial state vector (shape: (2,)).
+        p_i (np.ndarray): Initial error covariance matrix (shape: (2, 2)).
+        A, B, H, Q, R, R_u: Kalman filter parameters, see calcualte.
+        tol (float): Largest relative difference between P and its steady state value before switching.
+    Returns:
+        np.ndarray: Filtered states (shape: (T, 2)).
+    """
+    K_ss, P_ss = steady_state_gain(A, B, H, Q, R, R_u)
+    n = len(signal)
+    filtered_signal = np.empty((n, A.shape[0]))
+    x = x_i
+    p = p_i
+    
+    # Normal kalman filter until P is close to its steady state value
+    k = 0
+    while k < n and np.abs(p - P_ss).max() > tol * np.abs(P_ss).max():
+        x, p = calcualte(x, np.array([us[k]]), p, signal[k], A, B, H, Q, R, R_u)
+        filtered_signal[k] = x
+        k += 1
+    
+    if k < n:
+        # x_k = (I - K H) (A x_{k-1} + B u_k) + K z_k
+        I_KH = np.eye(A.shape[0]) - K_ss@H
+        zs = np.asarray(signal[k:], dtype=float).reshape(n - k, -1)
+        us_ = np.asarray(us[k:], dtype=float).reshape(n - k, -1)
+        ws = zs@K_ss.T + us_@(I_KH@B).T
+        filtered_signal[k:] = fixed_gain_recurrence(I_KH@A, ws, x)
+    return filtered_signal
+
 import matplotlib.pyplot as plt
 
 def pure_integral(x_i, us, A, B):
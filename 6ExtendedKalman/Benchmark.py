@@ -0,0 +1,49 @@
+import AdvKalman
+import ScalarKalman
+
+import numpy as np
+import time
+
+# Compares the run time of AdvKalman.filter and ScalarKalman.filter on signals of increasing length
+
+lengths = [10**4, 10**5, 10**6, 10**7]
+max_reference_length = 10**6 # AdvKalman.filter takes several minutes above this, its time is estimated instead
+rng = np.random.default_rng(seed=1)
+dt = 0.01
+
+# Same parameters as TestNoResidules.py
+q = np.array([[(dt**4)/4, (dt**3)/2], [(dt**3)/2, dt**2]])
+A = np.array([[1, dt], [0, 1]])
+B = np.array([[0.5 * dt**2], [dt]])
+H = np.array([[1, 0]])
+Q = 1 * q
+R = 20.0
+R_u = 20.0
+P_0 = np.array([[5.0, 0], [0, 5.0]])
+x_e = np.array([0.0, 2.4])
+
+def time_filter(filter, signal, us):
+    start_time = time.perf_counter()
+    filtered_signal = filter(signal, us, x_i=x_e, p_i=P_0, A=A, B=B, H=H, Q=Q, R=R, R_u=R_u)
+    end_time = time.perf_counter()
+    return filtered_signal, end_time - start_time
+
+print(f"{'Samples':>10} {'AdvKalman (s)':>15} {'ScalarKalman (s)':>18} {'Speedup':>9} {'Max diff':>10}")
+reference_rate = None
+for length in lengths:
+    t = np.arange(length) * dt
+    signal = np.sin(1.33 * t) + rng.normal(0, 0.3, length)
+    us = -1.33**2 * np.sin(1.33 * t) + rng.normal(0, 0.05, length)
+
+    fast_signal, fast_time = time_filter(ScalarKalman.filter, signal, us)
+    if length <= max_reference_length:
+        reference_signal, reference_time = time_filter(AdvKalman.filter, signal, us)
+        reference_rate = reference_time / length
+        max_diff = f"{np.abs(reference_signal - fast_signal).max():.1e}"
+        reference = f"{reference_time:.3f}"
+    else:
+        # Assumes the reference scales linearly with the number of samples
+        reference_time = reference_rate * length
+        max_diff = "-"
+        reference = f"~{reference_time:.0f} (est)"
+    print(f"{length:>10} {reference:>15} {fast_time:>18.3f} {reference_time / fast_time:>8.1f}x {max_diff:>10}")
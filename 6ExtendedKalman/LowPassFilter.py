@@ -1,13 +1,16 @@
-def filter(signal, alpha):
-    m_prev = signal[0]
-    rolling_avg = [m_prev]
-    
-    for m in signal:
-        m_new = alpha * m_prev + (1 - alpha) * m
-        rolling_avg.append(m_new)
-        m_prev = m_new
-    return rolling_avg
-
+import numpy as np
 
+import RecursiveFilter
 
-    
\ No newline at end of file
+def filter(signal, alpha):
+    """
+    Exponential moving average low pass filter, see RecursiveFilter.low_pass.
+    Args:
+        signal (np.ndarray): The signal to be filtered (shape: (n,) or (channels, n)).
+        alpha (float): The smoothing factor determines how quickly weightings of previous terms decay (exponentially).
+    Returns:
+        np.ndarray: The first sample followed by the filtered signal (shape: (n + 1,) or (channels, n + 1)).
+    """
+    signal = np.asarray(signal, dtype=float)
+    filtered_signal, _ = RecursiveFilter.low_pass(signal, alpha)
+    return np.concatenate([signal[..., :1], filtered_signal], axis=-1)
@@ -0,0 +1,81 @@
+import numpy as np
+
+def filter(signal, us, x_i, p_i, A, B, H, Q, R, R_u):
+    """
+    Position/velocity kalman filter with a single measurement, written out element by element.
+    Gives the same result as AdvKalman.filter but the innovation covariance is a scalar so it is divided
+    by rather than inverted, and no arrays are created inside the loop.
+    Args:
+        signal (np.ndarray): Position measurements (shape: (n,)).
+        us (np.ndarray): Control inputs i.e. acceleration measurements (shape: (n,)).
+        x_i (np.ndarray): Initial state vector [s, v] (shape: (2,)).
+        p_i (np.ndarray): Initial error covariance matrix (shape: (2, 2)).
+        A (np.ndarray): State transition matrix (shape: (2, 2)).
+        B (np.ndarray): Control input matrix (shape: (2, 1)).
+        H (np.ndarray): Measurement to state matrix (shape: (1, 2)).
+        Q (np.ndarray): Process noise covariance matrix (shape: (2, 2)).
+        R (float): Measurement noise covariance.
+        R_u (float): Control input noise covariance.
+    Returns:
+        np.ndarray: Filtered states [s, v] for each measurement (shape: (n, 2)).
+    """
+    # Unpack the constant matrices into python floats once
+    (a00, a01), (a10, a11) = np.asarray(A, dtype=float).tolist()
+    b0, b1 = np.asarray(B, dtype=float).ravel().tolist()
+    h0, h1 = np.asarray(H, dtype=float).ravel().tolist()
+    (q00, q01), (q10, q11) = np.asarray(Q, dtype=float).tolist()
+    r = float(np.asarray(R, dtype=float).ravel()[0])
+    r_u = float(np.asarray(R_u, dtype=float).ravel()[0])
+
+    # Process noise including the control input noise B*R_u*B.T
+    g00 = q00 + r_u*b0*b0
+    g01 = q01 + r_u*b0*b1
+    g10 = q10 + r_u*b1*b0
+    g11 = q11 + r_u*b1*b1
+
+    x0, x1 = np.asarray(x_i, dtype=float).ravel().tolist()
+    (p00, p01), (p10, p11) = np.asarray(p_i, dtype=float).tolist()
+
+    n = len(signal)
+    filtered_signal = np.empty((n, 2))
+    out = filtered_signal.reshape(-1)
+    zs = np.asarray(signal, dtype=float).tolist()
+    us = np.asarray(us, dtype=float).tolist()
+
+    for k in range(n):
+        u = us[k]
+        # Predict state
+        xp0 = a00*x0 + a01*x1 + b0*u
+        xp1 = a10*x0 + a11*x1 + b1*u
+
+        # Predict error covariance, A P A.T + B R_u B.T + Q
+        ap00 = a00*p00 + a01*p10
+        ap01 = a00*p01 + a01*p11
+        ap10 = a10*p00 + a11*p10
+        ap11 = a10*p01 + a11*p11
+        pp00 = ap00*a00 + ap01*a01 + g00
+        pp01 = ap00*a10 + ap01*a11 + g01
+        pp10 = ap10*a00 + ap11*a01 + g10
+        pp11 = ap10*a10 + ap11*a11 + g11
+
+        # H P_p and the scalar innovation covariance H P_p H.T + R
+        hp0 = h0*pp00 + h1*pp10
+        hp1 = h0*pp01 + h1*pp11
+        s = hp0*h0 + hp1*h1 + r
+
+        # Kalman gain P_p H.T / s
+        k0 = (pp00*h0 + pp01*h1) / s
+        k1 = (pp10*h0 + pp11*h1) / s
+
+        # Correct state and error covariance
+        y = zs[k] - (h0*xp0 + h1*xp1)
+        x0 = xp0 + k0*y
+        x1 = xp1 + k1*y
+        p00 = pp00 - k0*hp0
+        p01 = pp01 - k0*hp1
+        p10 = pp10 - k1*hp0
+        p11 = pp11 - k1*hp1
+
+        out[2*k] = x0
+        out[2*k + 1] = x1
+    return filtered_signal
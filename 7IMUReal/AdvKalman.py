@@ -1,8 +1,9 @@
 import numpy as np
 import scipy.constants as sc
-from scipy.spatial.transform import Rotation as R
 import matplotlib.pyplot as plt
 
+import Quaternion
+
 def difference(z, H, x_p):
     """
     - Compute z - H @ x_p considering the cyclic nature of quanternions.
@@ -13,17 +14,10 @@ def difference(z, H, x_p):
     Returns:
         np.ndarray: The difference vector (shape: (4,)).
     """
-    # Compute predicted measurement
-    z_pred = H @ x_p
-    
-    # Compute raw difference
-    diff = z - z_pred
-    
     # Handle quaternion double cover (q and -q represent same rotation)
-    # Choose the quaternion that gives the smaller angle difference
-    if np.dot(z, z_pred) < 0:
-        # If dot product is negative, use -z_pred instead
-        diff = z - (-z_pred)
+    # Choose the sign of the predicted measurement that gives the smaller angle difference
+    z_pred = Quaternion.align(H @ x_p, z)
+    diff = z - z_pred
     
     return diff
 
@@ -70,25 +64,7 @@ def quat2EP(beta):
                     - theta: Pitch angle
                     - phi: Roll angle
     """
-    
-    q0, q1, q2, q3 = beta
-    psi = np.arctan2(2*(q1*q2+q0*q3),q0*q0+q1*q1-q2*q2-q3*q3) 
-    phi = np.arctan2(2*(q2*q3+q0*q1),q0*q0-q1*q1-q2*q2+q3*q3)
-    sin_theta = -2 * (q1 * q3 - q0 * q2)  # sin(theta) = -2*(q1*q3 - q0*q2)
-    if abs(sin_theta) <= 1:
-        # Normal case
-        theta = np.arcsin(sin_theta)
-    else:
-        # Handle cyclic case - when |sin_theta| > 1
-        if sin_theta > 1:
-            # sin_theta > 1 means theta should be π/2 + extra rotation
-            theta = np.pi/2 - np.arcsin(2 - sin_theta)
-        else:  # sin_theta < -1
-            # sin_theta < -1 means theta should be -π/2 - extra rotation  
-            theta = -np.pi/2 + np.arcsin(2 + sin_theta)
-    theta = (theta - np.pi/2) % np.pi - np.pi/2  # Normalize to [-pi/2, pi/2]
-    return np.array([psi, theta, phi])
-    
+    return Quaternion.to_euler(beta)
     
 def EP2quat(euler_angles):
     """
@@ -100,10 +76,7 @@ def EP2quat(euler_angles):
                     q0: scalar part
                     q1, q2, q3: vector part x,y,z
     """
-    r = R.from_euler('zyx', euler_angles) 
-    quat = r.as_quat()  
-    q0, q1, q2, q3 = quat[3], quat[0], quat[1], quat[2]
-    return np.array([q0, q1, q2, q3])
+    return Quaternion.from_euler(euler_angles)
 
 def get_attitude_measurment(as_, ms = None):
     """
@@ -142,6 +115,139 @@ def get_attitude_measurment(as_, ms = None):
         psi = (((psi_ + np.pi) - psi_[0]) % (2 * np.pi)) - np.pi  # Normalize to [-pi, pi]
         return np.array([-psi, -theta, phi])
 
+def transition_matrices(ws, dt):
+    """
+    - Builds the state transition matrix A = I + dt * B for every gyroscope sample in one vectorised step.
+    Args:
+        ws (np.ndarray): Gyroscope data (shape: (n, 3)).
+        dt (float): Time step in seconds.
+    Returns:
+        np.ndarray: Stack of state transition matrices (shape: (n, 4, 4)).
+    """
+    w_1, w_2, w_3 = ws[:, 0], ws[:, 1], ws[:, 2]
+    B = np.zeros((len(ws), 4, 4))
+    B[:, 0, 1], B[:, 0, 2], B[:, 0, 3] = -w_1, -w_2, -w_3
+    B[:, 1, 0], B[:, 1, 2], B[:, 1, 3] = w_1, w_3, -w_2
+    B[:, 2, 0], B[:, 2, 1], B[:, 2, 3] = w_2, -w_3, w_1
+    B[:, 3, 0], B[:, 3, 1], B[:, 3, 2] = w_3, w_2, -w_1
+    return np.eye(4) + dt * (0.5 * B)
+
+def scalar_multiple(M):
+    """
+    - Checks whether a matrix is a multiple of the identity.
+    Args:
+        M (np.ndarray): Square matrix.
+    Returns:
+        float: The multiple s if M = s * I, otherwise None.
+    """
+    M = np.asarray(M, dtype=float)
+    s = M[0, 0]
+    return float(s) if np.array_equal(M, s * np.eye(len(M))) else None
+
+def filter_isotropic(x_i, p, zs_q, ws, dt, q, r, correct_mode = True):
+    """
+    - Kalman filter loop for when H = I and Q, R and the initial covariance are multiples of the identity.
+    - A = I + dt * B is a scaled rotation so A @ A.T = (1 + (dt/2)^2 |w|^2) I, which means the covariance stays
+      a multiple of the identity and can be tracked as a single number instead of a 4x4 matrix.
+    Args:
+        x_i (np.ndarray): Initial state vector (shape: (4,)).
+        p (float): Initial error covariance, p_i = p * I.
+        zs_q (np.ndarray): Measurement quaternions (shape: (n, 4)).
+        ws (np.ndarray): Gyroscope data (shape: (n, 3)).
+        dt (float): Time step in seconds.
+        q (float): Process noise covariance, Q = q * I.
+        r (float): Measurement noise covariance, R = r * I.
+        correct_mode (bool): If True, perform correction step; if False, only predict.
+    Returns:
+        np.ndarray: The state quaternion after each step (shape: (n, 4)).
+    """
+    n = len(ws)
+    h = 0.5 * dt
+    quats = np.empty((n, 4))
+    out = quats.reshape(-1)
+    scales = (1 + h * h * np.einsum('ij,ij->i', ws, ws)).tolist()  # A @ A.T for every step
+    ws = np.asarray(ws, dtype=float).tolist()
+    zs_q = np.asarray(zs_q, dtype=float).tolist()
+    x0, x1, x2, x3 = np.asarray(x_i, dtype=float).tolist()
+    
+    for i in range(n):
+        w_1, w_2, w_3 = ws[i]
+        # Predict state, x_p = A @ x
+        xp0 = x0 + h * (-w_1 * x1 - w_2 * x2 - w_3 * x3)
+        xp1 = x1 + h * (w_1 * x0 + w_3 * x2 - w_2 * x3)
+        xp2 = x2 + h * (w_2 * x0 - w_3 * x1 + w_1 * x3)
+        xp3 = x3 + h * (w_3 * x0 + w_2 * x1 - w_1 * x2)
+        # Predict error covariance, A @ P @ A.T + Q
+        p = scales[i] * p + q
+        
+        if correct_mode:
+            k = p / (p + r)
+            z0, z1, z2, z3 = zs_q[i]
+            # Same as difference, use -x_p if it is closer to the measurement
+            if z0 * xp0 + z1 * xp1 + z2 * xp2 + z3 * xp3 < 0:
+                x0, x1, x2, x3 = xp0 + k * (z0 + xp0), xp1 + k * (z1 + xp1), xp2 + k * (z2 + xp2), xp3 + k * (z3 + xp3)
+            else:
+                x0, x1, x2, x3 = xp0 + k * (z0 - xp0), xp1 + k * (z1 - xp1), xp2 + k * (z2 - xp2), xp3 + k * (z3 - xp3)
+            p = p - k * p
+        else:
+            x0, x1, x2, x3 = xp0, xp1, xp2, xp3
+        out[4*i:4*i + 4] = x0, x1, x2, x3
+    return quats
+
+def integrate_gyro(ws, x_i, dt = 0.05, processes = None):
+    """
+    - Same result as filter with correct_mode = False, without the python loop.
+    - Without the correction step each state is x_p = A @ x, and A = I + dt * B is the same as multiplying the
+      quaternion by [1, dt/2 * w] on the right, so the states are the running product of these quaternions,
+      which is calculated with Quaternion.cumulative_product.
+    Args:
+        ws (np.ndarray): Gyroscope data (shape: (n, 3)).
+        x_i (np.ndarray): Initial state vector (shape: (4,)).
+        dt (float, optional): Time step in seconds. Defaults to 0.05.
+        processes (int, optional): Number of worker processes for very long logs, see Quaternion.cumulative_product.
+    Returns:
+        np.ndarray: Euler angles [psi, theta, phi] after each step (shape: (n, 3)).
+    """
+    n = len(ws)
+    steps = np.empty((n + 1, 4))
+    steps[0] = x_i
+    steps[1:, 0] = 1
+    steps[1:, 1:] = ws
+    steps[1:, 1:] *= 0.5 * dt
+    quats = Quaternion.cumulative_product(steps, processes=processes)[1:]
+    return Quaternion.to_euler(quats)
+
+def filter_quaternions(zs_q, ws, x_i, p_i, dt = 0.05, **kwargs):
+    """
+    - The kalman filter loop for measurements which are already quaternions, see filter.
+    Args:
+        zs_q (np.ndarray): Measurement quaternions (shape: (n, 4)).
+        ws (np.ndarray): Gyroscope data (shape: (n, 3)).
+        x_i (np.ndarray): Initial state vector (shape: (4,)).
+        p_i (np.ndarray): Initial error covariance matrix (shape: (4, 4)).
+        dt (float, optional): Time step in seconds. Defaults to 0.05.
+        **kwargs: contains the parameters for the kalman filter algorithm
+    Returns:
+        np.ndarray: The state quaternion after each step (shape: (n, 4)).
+    """
+    n = len(ws)
+    x = x_i.copy()
+    p = p_i.copy()
+    h = scalar_multiple(kwargs['H'])
+    q = scalar_multiple(kwargs['Q'])
+    r = scalar_multiple(kwargs['R'])
+    p_0 = scalar_multiple(p)
+    if h == 1 and None not in (q, r, p_0):
+        # Fast path, the covariance stays a multiple of the identity
+        return filter_isotropic(x, p_0, zs_q, ws, dt, q, r, correct_mode=kwargs.get('correct_mode', True))
+    # Everything which doesn't depend on the previous state is calculated before the loop
+    As = transition_matrices(ws, dt)  # shape (n, 4, 4)
+    quats = np.empty((n, 4))
+    for i in range(n):
+        x, p = calcualte(x, p, zs_q[i], As[i], **kwargs)
+        quats[i] = x
+    return quats
+
 def filter(as_, ws, x_i, p_i, dt = 0.05, ms = None, **kwargs):
     """Main loop for the kalman fitler which calls the other functions to calcualte the filtered signal.
     Args:
@@ -156,26 +262,9 @@ def filter(as_, ws, x_i, p_i, dt = 0.05, ms = None, **kwargs):
         ms (np.ndarray, optional): Magnetometer data (shape: (n, 3))
         **kwargs: contains the parameters for the kalman filter algorithm
         """
-    n = len(ws)
-    filtered_signal = np.zeros((n, 3))
-    x = x_i.copy()
-    p = p_i.copy()
     eulers = get_attitude_measurment(as_, ms = ms).T
-    zs_q = np.apply_along_axis(EP2quat, 1, eulers)  # shape (n, 4)
-    
-    for i in range(n):
-        w_1, w_2, w_3 = ws[i]
-        B = 0.5 * np.array([
-            [0, -w_1, -w_2, -w_3], 
-            [w_1, 0, w_3, -w_2], 
-            [w_2, -w_3, 0, w_1], 
-            [w_3, w_2, -w_1, 0]
-        ])
-        A = np.eye(4) + dt * B
-        x, p = calcualte(x, p, zs_q[i], A, **kwargs)
-        filtered_signal[i] = quat2EP(x)
-    zs_EP = np.apply_along_axis(quat2EP, 1, zs_q)  # shape (n, 3)
-    print(filtered_signal)
+    zs_q = Quaternion.from_euler(eulers)  # shape (n, 4)
+    quats = filter_quaternions(zs_q, ws, x_i, p_i, dt, **kwargs)
+    filtered_signal = Quaternion.to_euler(quats)  # shape (n, 3)
+    zs_EP = Quaternion.to_euler(zs_q)  # shape (n, 3)
     return filtered_signal, zs_EP
-    
-    
\ No newline at end of file
@@ -1,10 +1,17 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.widgets import Slider
 import scipy.constants as sc
 
+import AdvKalman
+import ArsData
+import Files
+import MPULog
 import OrientationKalman
+import Quaternion
+import ResultCache
+import SensorLogger
+import Stages
 
 g = sc.g  # Acceleration due to gravity in m/s^2
 
@@ -12,6 +19,25 @@ g = sc.g  # Acceleration due to gravity in m/s^2
 LSB2g = 16384**-1
 LSB2w = 131**-1
 
+# Results are saved in .cache/results so repeat runs with the same data and parameters load them instead
+cache = ResultCache.ResultCache()
+KALMAN_VERSION = ResultCache.code_version(OrientationKalman, AdvKalman, Quaternion)
+
+def orientation_stages(w, a, dt, q, r, ms = None):
+    """
+    - The stages of OrientationKalman.run, so changing q or r only runs the Kalman filter again.
+    - The measurements only depend on the accelerometer (and magnetometer) and the gyroscope integration on the gyroscope and dt.
+    Returns:
+        Stages.Stages: The graph with the stages "measurements", "gyro" and "kalman".
+    """
+    stages = Stages.Stages(cache)
+    stages.add("measurements", lambda a, ms: OrientationKalman.measure(a, ms=ms), ["a", "ms"], KALMAN_VERSION)
+    stages.add("gyro", lambda w, dt: OrientationKalman.integrate(w, dt=dt), ["w", "dt"], KALMAN_VERSION)
+    stages.add("kalman", lambda w, measurements, dt, q, r: OrientationKalman.fuse(w, measurements[1], q=q, r=r, dt=dt),
+               ["w", "measurements", "dt", "q", "r"], KALMAN_VERSION)
+    stages.set(w=w, a=a, ms=ms, dt=dt, q=q, r=r)
+    return stages
+
 class AnalyseMPU: 
     """Class to read and analyse data from the MPU6050 sensor.
 
@@ -32,25 +58,38 @@ class AnalyseMPU:
         Returns:
             None
         """
-        ax_off, ay_off, az_off, gx_off, gy_off, gz_off = self._background(f"MPUData/{folder_name}/calibration.csv")
+        self.offsets = self._background(f"MPUData/{folder_name}/calibration.csv")
+        ax_off, ay_off, az_off, gx_off, gy_off, gz_off = self.offsets
         self.q = q  # Process noise covariance
         self.r = r  # Measurement noise covariance
         
         
-        # Reads in file
-        df = pd.read_csv(f"MPUData/{folder_name}/data.csv", header = 0)
-        df.set_index("t", inplace=True)
-        df = df.apply(pd.to_numeric, errors='coerce') 
-        df = df.dropna()
+        # Reads in file, malformed rows are dropped
+        # The raw int16 readings are kept, they are converted to SI units in one pass straight into self.a and self.w
+        self.raw = MPULog.read(f"MPUData/{folder_name}/data.csv")
         
         # Saved data as attributes of the object
-        self.a = -np.column_stack([df['ax'] - ax_off, df['ay'] - ay_off, df['az'] - az_off]) * LSB2g * g # Convert to m/s^2
-        self.w = np.column_stack([df['gx'] - gx_off, df['gy'] - gy_off, df['gz'] - gz_off ]) * LSB2w * (np.pi / 180) # Convert to radians/s
+        self.a = MPULog.convert(self.raw, ['ax', 'ay', 'az'], [ax_off, ay_off, az_off], -LSB2g * g) # Convert to m/s^2
+        self.w = MPULog.convert(self.raw, ['gx', 'gy', 'gz'], [gx_off, gy_off, gz_off], LSB2w * (np.pi / 180)) # Convert to radians/s
         
-        self.dt = np.diff(df.index).mean() / 1000 # Convert to seconds
-        self.t = df.index.values / 1000  # Convert to seconds
+        self.dt = np.diff(self.raw['t']).mean() / 1000 # Convert to seconds
+        self.t = self.raw['t'] / 1000  # Convert to seconds
         # Kalman filtered attitude, acclearometer attitude, gyroscope attitude
-        self.theta, self.theta_a, self.theta_g, self.zs = OrientationKalman.run(self.w, self.a, dt=self.dt, q=self.q, r=self.r)
+        self.stages = orientation_stages(self.w, self.a, self.dt, self.q, self.r)
+        self._filter()
+        
+    def _filter(self):
+        """
+        - Runs the stages which depend on parameters that have changed since the last call, see orientation_stages.
+        Args:
+            None
+        Returns:
+            None
+        """
+        self.stages.set(q=self.q, r=self.r)
+        self.theta_a, _, self.zs = self.stages.get("measurements")
+        self.theta_g = self.stages.get("gyro")
+        self.theta = self.stages.get("kalman")
         
     def _setup_sliders(self, fig, length = 0.725, height = 0.03):
         """
@@ -85,8 +124,8 @@ class AnalyseMPU:
         self.q = 10**self.s_logq.val
         self.r = 10**self.s_logr.val
         
-        # Recalculates the Kalman filter with the new q and r values only self.theta will be updated
-        self.theta, self.theta_a, self.theta_g, self.zs = OrientationKalman.run(self.w, self.a, dt=self.dt, q=self.q, r=self.r)
+        # Only the Kalman filter depends on q and r, the measurements and gyroscope integration aren't recalculated
+        self._filter()
         
         # Updates graph data so graph can be redrawn
         self.line_yaw.set_offsets(np.column_stack((self.t, self.theta[:, 0])))
@@ -103,18 +142,15 @@ class AnalyseMPU:
         Returns:
             offsets (tuple): A tuple containing the offsets for ax, ay, az, gx, gy, gz.
         """
-        df = pd.read_csv(filename, header = 0)
-        df.set_index("t", inplace=True)
-        df = df.apply(pd.to_numeric, errors='coerce') 
-        df = df.dropna()
+        data = MPULog.read(filename)
         
         # Calcualtes offset based on
-        ax_offset = df['ax'].mean()
-        ay_offset = df['ay'].mean()
-        az_offset = df['az'].mean() - (1/LSB2g)
-        wx_offset = df['gx'].mean()
-        wy_offset = df['gy'].mean()
-        wz_offset = df['gz'].mean()
+        ax_offset = data['ax'].mean()
+        ay_offset = data['ay'].mean()
+        az_offset = data['az'].mean() - (1/LSB2g)
+        wx_offset = data['gx'].mean()
+        wy_offset = data['gy'].mean()
+        wz_offset = data['gz'].mean()
         return ax_offset, ay_offset, az_offset, wx_offset, wy_offset, wz_offset
         
         
@@ -272,35 +308,17 @@ class AnalyseMPU:
         ax.set_zlabel('Z')
 
         quivers = []
+        
+        if data == "kalman":
+            eulers = self.theta
+        elif data == "gyro":
+            eulers = self.theta_g
+        # Rotation matrices (3-2-1: yaw-pitch-roll) for every frame, the columns are the rotated axes
+        Rs = Quaternion.to_matrix(Quaternion.from_euler(eulers, intrinsic=True))
 
-        for i in range(len(self.theta)):
-            if data == "kalman":
-                psi, theta, phi = self.theta[i] 
-            elif data == "gyro":
-                psi, theta, phi = self.theta_g[i]
-
-            # Rotation matrices (3-2-1: yaw-pitch-roll)
-            Rz = np.array([
-                [np.cos(psi), -np.sin(psi), 0],
-                [np.sin(psi),  np.cos(psi), 0],
-                [0,            0,           1]
-            ])
-            Ry = np.array([
-                [np.cos(theta), 0, np.sin(theta)],
-                [0,             1, 0],
-                [-np.sin(theta),0, np.cos(theta)]
-            ])
-            Rx = np.array([
-                [1, 0,            0],
-                [0, np.cos(phi), -np.sin(phi)],
-                [0, np.sin(phi),  np.cos(phi)]
-            ])
-            R = Rz @ Ry @ Rx
-
+        for i in range(len(eulers)):
             # Rotated axes
-            x_axis = R @ np.array([1, 0, 0])
-            y_axis = R @ np.array([0, 1, 0])
-            z_axis = R @ np.array([0, 0, 1])
+            x_axis, y_axis, z_axis = Rs[i].T
 
             # Remove previous arrows
             for q in quivers:
@@ -322,7 +340,7 @@ class AnalysePhone(AnalyseMPU): #
     def __init__(self, FolderName, q = 10**-1.6, r = 10**-1.6):
         """
         - Reads Gravity, Gyroscope, Magnetometer and Orientation data from a files
-        - Puts this data into a single pandas dataframe
+        - Aligns this data onto the gravity timestamps
         - saves the data as attributes of the object.
         Args:
             FolderName (str): Name of the folder containing the sensor data files.
@@ -334,68 +352,32 @@ class AnalysePhone(AnalyseMPU): #
         self.q = q
         self.r = r  
         
-        # get accelarometer data in x,y,z directions
-        df_a = pd.read_csv("SensorLoggerData/" + FolderName + "/Gravity.csv", header=0)
-        # get gyroscope data in x,y,z directions
-        df_w = pd.read_csv("SensorLoggerData/" + FolderName + "/Gyroscope.csv", header=0)
-        # Get magnetometer data in x,y,z directions
-        df_m = pd.read_csv("SensorLoggerData/" + FolderName + "/Magnetometer.csv", header=0)
-        # Get true orientation data in yaw pitch, roll.
-        df_o = pd.read_csv("SensorLoggerData/" + FolderName + "/Orientation.csv", header=0)
-        
-        # drop real time
-        df_a.drop(columns=['time'], inplace=True)
-        # rename columns to a_x, a_y, a_z for accelerometer data
-        df_a = df_a.rename(columns={'x': 'a_x', 'y': 'a_y', 'z': 'a_z'})
+        # Gravity, Gyroscope and Magnetometer have the columns x, y, z. Orientation has yaw, pitch, roll.
+        folder = "SensorLoggerData/" + FolderName
+        names = ["Gravity", "Gyroscope", "Magnetometer", "Orientation"]
+        columns = {"Orientation": ["yaw", "pitch", "roll"]}
         
-        df_w.drop(columns=['time'], inplace=True)
-        df_w = df_w.rename(columns={'x': 'w_x', 'y': 'w_y', 'z': 'w_z'})
+        # Align every sensor to the gravity timestamps using the nearest seconds_elapsed value, since they aren't exactly the same for each sensor
+        # Timestamps where any sensor has no sample within 0.01 seconds are dropped, the number dropped is in alignment_report
+        # The aligned sensors are cached, they are only read and aligned again if one of the files changes
+        paths = [SensorLogger.find_source(folder, name) for name in names]
+        sources = [(path, Files.fingerprint(path)) for path in paths]
+        self.t, aligned, self.alignment_report = cache.compute(
+            "align", lambda: SensorLogger.align(SensorLogger.read_sensors(folder, names), columns=columns, reference="Gravity", tolerance=0.01),
+            sources, columns, "Gravity", 0.01, ResultCache.code_version(SensorLogger))
         
-        df_m.drop(columns=['time'], inplace=True)
-        df_m = df_m.rename(columns={'x': 'm_x', 'y': 'm_y', 'z': 'm_z'})
-        
-        df_o.drop(columns=['time'], inplace=True)
-        
-        # Merge dataframes based on nearest seconds_elapsed value, since they exactly aren't the same in each dataframe
-        df_merged = pd.merge_asof(df_a, df_w, on='seconds_elapsed', tolerance=0.01)
-        df_merged = pd.merge_asof(df_merged, df_m, on='seconds_elapsed', tolerance=0.01)
-        df_merged = pd.merge_asof(df_merged, df_o, on='seconds_elapsed', tolerance=0.01)
-        df_merged.dropna(inplace=True)
-        
-        # Retrieves the time, angular velocity, acceleration and magnetometer data from the merged dataframe
         # Saves data as attributes of the object
-        self.t = df_merged['seconds_elapsed'].values
         self.dt = np.diff(self.t).mean()
-        self.w = np.column_stack([df_merged['w_x'], df_merged['w_y'], df_merged['w_z']]) 
-        self.a = -np.column_stack([df_merged['a_x'], df_merged['a_y'], df_merged['a_z']]) # a has the opposite sign to match our model
-        self.m = np.column_stack([df_merged['m_x'], df_merged['m_y'], df_merged['m_z']])
+        self.w = aligned["Gyroscope"]
+        self.a = -aligned["Gravity"] # a has the opposite sign to match our model
+        self.m = aligned["Magnetometer"]
+        yaw, pitch, roll = aligned["Orientation"].T
         # pitch and roll are swapped for the phones real data
-        ot_u = np.column_stack([-(df_merged['yaw'] - df_merged['yaw'].iloc[0]), (df_merged['roll'] - df_merged['roll'].iloc[0]), -(df_merged['pitch'] - df_merged['pitch'].iloc[0])]) 
+        ot_u = np.column_stack([-(yaw - yaw[0]), (roll - roll[0]), -(pitch - pitch[0])]) 
         self.ot = renormalise(ot_u)
         
-        self.theta, self.theta_a, self.theta_g, self.zs = OrientationKalman.run(self.w, self.a, dt=self.dt, q=self.q, r=self.r, ms=self.m)
-    
-    def _update(self):
-        """
-        - Overides the _update method from AnalyseMPU since the kalman filter also requires this data
-        - Updates the Kalman filter based on the new values in the sliders.
-        Args:
-            None
-        Returns:
-            None
-        """
-        # Handles the sliders logarithmic effects
-        self.q = 10**self.s_logq.val
-        self.r = 10**self.s_logr.val
-        
-        # Recalculates the Kalman filter with the new q and r values only self.theta will be updated
-        self.theta, self.theta_a, self.theta_g, self.zs = OrientationKalman.run(self.w, self.a, dt=self.dt, q=self.q, r=self.r, ms = self.m)
-        
-        # Updates graph data so graph can be redrawn
-        self.line_yaw.set_offsets(np.column_stack((self.t, self.theta[:, 0])))
-        self.line_pitch.set_offsets(np.column_stack((self.t, self.theta[:, 1])))
-        self.line_roll.set_offsets(np.column_stack((self.t, self.theta[:, 2])))
-        fig.canvas.draw_idle()
+        self.stages = orientation_stages(self.w, self.a, self.dt, self.q, self.r, ms=self.m)
+        self._filter()
     
     def plot_true(self, fig = None, axs = None, alpha = 0.8):
         """
@@ -456,30 +438,15 @@ class AnalyseTestData(AnalyseMPU):
         self.q = 10**-1.6  # Process noise covariance
         self.r = 10**0.7  # Measurement noise covariance
         
-        df = pd.read_json('Data/ArsGyro.json')
-        data = df["data"]
-        data_df = pd.DataFrame(data)
-
-        w_1 = np.array(data_df.loc["wx", "data"])
-        w_2 = np.array(data_df.loc["wy", "data"])
-        w_3 = np.array(data_df.loc["wz", "data"])
-        self.w = np.column_stack((w_1, w_2, w_3)) 
-
-        # For reading accelerometer data from ArsAccel.json
-        df = pd.read_json('Data/ArsAccel.json')
-        data = df["data"]
-
-        data_df = pd.DataFrame(data)
-
-        a_1 = np.array(data_df.loc["fx", "data"])
-        a_2 = np.array(data_df.loc["fy", "data"])
-        a_3 = np.array(data_df.loc["fz", "data"])
-        self.a = np.column_stack((a_1, a_2, a_3))
+        # Cached as .npy after the first run
+        self.w = ArsData.read_gyro('Data')
+        self.a = ArsData.read_accel('Data')
         
         self.dt = 0.01
         self.t = np.arange(0, len(self.w) * self.dt, self.dt) 
         
-        self.theta, self.theta_a, self.theta_g, self.zs = OrientationKalman.run(self.w, self.a, dt=self.dt, q=self.q, r=self.r)
+        self.stages = orientation_stages(self.w, self.a, self.dt, self.q, self.r)
+        self._filter()
         
 def renormalise(x):
         """
@@ -0,0 +1,71 @@
+import json
+import os
+
+import numpy as np
+
+import Files
+
+# Loads the ArsGyro and ArsAccel reference data, exported from MATLAB as JSON: {"header": ..., "data": {"wx": [...], ...}}.
+# The first time a file is read its axes are saved as one (n, 3) float64 .npy file in the .cache folder next to it,
+# later reads memory map the .npy file instead of parsing the JSON again.
+
+CACHE_DIR = ".cache"
+GYRO_COLUMNS = ['wx', 'wy', 'wz']
+ACCEL_COLUMNS = ['fx', 'fy', 'fz']
+
+def read_json(path, columns):
+    """
+    Parses the columns out of a MATLAB JSON export.
+    Returns:
+        np.ndarray: The columns side by side (shape: (n, len(columns))).
+    """
+    with open(path) as f:
+        data = json.load(f)["data"]
+    return np.ascontiguousarray(np.column_stack([np.asarray(data[column], dtype=np.float64) for column in columns]))
+
+def read(path, columns, cache = True):
+    """
+    - Reads columns from a MATLAB JSON export, the first time they are saved to a .npy file in the .cache folder next to it.
+    - Later reads memory map the .npy file as long as the JSON's size and modification time haven't changed.
+    Args:
+        path (str): Path to the JSON e.g. "Data/ArsGyro.json".
+        columns (list): Columns to read e.g. ['wx', 'wy', 'wz'].
+        cache (bool): Whether to use the .npy cache. Defaults to True.
+    Returns:
+        np.ndarray: The columns side by side, read only when cached (shape: (n, len(columns))).
+    """
+    if not cache:
+        return read_json(path, columns)
+    folder, filename = os.path.split(path)
+    name = os.path.splitext(filename)[0]
+    cache_folder = os.path.join(folder, CACHE_DIR)
+    npy_path = os.path.join(cache_folder, f"{name}.npy")
+    meta_path = os.path.join(cache_folder, f"{name}.json")
+    fingerprint = dict(Files.fingerprint(path), columns=list(columns))
+    try:
+        with open(meta_path) as f:
+            if json.load(f) == fingerprint:
+                return np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+
+    values = read_json(path, columns)
+    os.makedirs(cache_folder, exist_ok=True)
+    Files.atomic_write(npy_path, lambda f: np.save(f, values))
+    # The metadata is written last, the cache is only used once it matches the JSON
+    Files.write_json(meta_path, fingerprint)
+    return np.load(npy_path, mmap_mode="r")
+
+def read_gyro(folder = "Data", cache = True):
+    """
+    Returns:
+        np.ndarray: Angular velocities wx, wy, wz from ArsGyro.json in rad/s (shape: (n, 3)).
+    """
+    return read(os.path.join(folder, "ArsGyro.json"), GYRO_COLUMNS, cache=cache)
+
+def read_accel(folder = "Data", cache = True):
+    """
+    Returns:
+        np.ndarray: Accelerations fx, fy, fz from ArsAccel.json in m/s^2 (shape: (n, 3)).
+    """
+    return read(os.path.join(folder, "ArsAccel.json"), ACCEL_COLUMNS, cache=cache)
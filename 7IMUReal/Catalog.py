@@ -0,0 +1,244 @@
+import json
+import os
+import zipfile
+
+import pandas as pd
+
+import Files
+import SensorLogger
+
+# Index of every recorded session, so the sessions can be listed and filtered without loading any sensor data.
+# SensorLogger sessions are folders with a Metadata.csv (e.g. SensorLoggerData/PitchRoll), MPU6050 sessions are
+# folders with a data.csv (e.g. MPUData/Pitch). Only the first and last lines of each csv are parsed, the rows are
+# counted by counting newlines. The catalog is saved in the root's .cache folder and a folder is only rescanned
+# when the size or modification time of one of its files has changed.
+
+CACHE_DIR = ".cache"
+CATALOG_FILE = "catalog.json"
+
+def _fingerprints(folder):
+    """
+    Returns:
+        dict: File name to the size and modification time of every file in the folder.
+    """
+    fingerprints = {}
+    for entry in os.scandir(folder):
+        if entry.is_file():
+            fingerprints[entry.name] = Files.fingerprint(entry.path)
+    return fingerprints
+
+def _summarise(f, column):
+    """
+    - Counts the rows of an open csv and reads column from its first and last rows, without parsing the rest.
+    Args:
+        f (file): The csv opened in binary mode.
+        column (str): Column to read e.g. "seconds_elapsed".
+    Returns:
+        int: Number of rows, not counting the header.
+        float: Value of column in the first row, None if there are no rows.
+        float: Value of column in the last row, None if there are no rows.
+    """
+    header = f.readline()
+    if not header.strip():
+        return 0, None, None
+    names = header.decode("latin-1").strip().split(",")
+    first = f.readline()
+    if not first.strip():
+        return 0, None, None
+    rows = 1
+    tail = b""
+    for block in iter(lambda: f.read(2**20), b""):
+        rows += block.count(b"\n")
+        tail = (tail + block)[-4096:]
+    if tail and not tail.endswith(b"\n"):
+        rows += 1  # The last row has no newline
+    last = next((line for line in reversed(tail.splitlines()) if line.strip()), first)
+    index = names.index(column)
+    value = lambda line: float(line.decode("latin-1").strip().split(",")[index])
+    return rows, value(first), value(last)
+
+def scan_sensor_logger(folder):
+    """
+    - Summarises a SensorLogger session from its Metadata.csv and the first and last lines of each sensor.
+    - Sensors which are only in the session's zip are read out of the zip.
+    Args:
+        folder (str): Path to the session folder e.g. "SensorLoggerData/PitchRoll".
+    Returns:
+        dict: The session's entry in the catalog.
+    """
+    meta = SensorLogger.read_file(folder, "Metadata").iloc[0]
+    rates = SensorLogger.read_metadata(folder)
+    sensors = {}
+    for sensor, rate in rates.items():
+        try:
+            source = SensorLogger.find_source(folder, sensor)
+        except FileNotFoundError:
+            continue
+        if source.endswith(".zip"):
+            with zipfile.ZipFile(source) as z:
+                if f"{sensor}.csv" not in z.namelist():
+                    continue
+                with z.open(f"{sensor}.csv") as f:
+                    rows, start, stop = _summarise(f, "seconds_elapsed")
+        else:
+            with open(source, "rb") as f:
+                rows, start, stop = _summarise(f, "seconds_elapsed")
+        sensors[sensor] = {"sample_rate_ms": rate, "rows": rows, "start": start, "stop": stop}
+    spans = [(s["start"], s["stop"]) for s in sensors.values() if s["rows"]]
+    return {
+        "kind": "phone",
+        "device": str(meta["device name"]),
+        "recording_epoch_ms": int(meta["recording epoch time"]),
+        "recording_time": str(meta["recording time"]),
+        "sensors": sensors,
+        "start": min(span[0] for span in spans) if spans else None,
+        "stop": max(span[1] for span in spans) if spans else None,
+    }
+
+def scan_mpu(folder):
+    """
+    - Summarises an MPU6050 session from the first and last lines of its data.csv, t is in milliseconds.
+    Args:
+        folder (str): Path to the session folder e.g. "MPUData/Pitch".
+    Returns:
+        dict: The session's entry in the catalog.
+    """
+    with open(os.path.join(folder, "data.csv"), "rb") as f:
+        rows, start, stop = _summarise(f, "t")
+    start = None if start is None else start / 1000
+    stop = None if stop is None else stop / 1000
+    rate = None if rows < 2 else (stop - start) * 1000 / (rows - 1)
+    return {
+        "kind": "mpu",
+        "device": "MPU6050",
+        "calibrated": os.path.exists(os.path.join(folder, "calibration.csv")),
+        "sensors": {"MPU6050": {"sample_rate_ms": rate, "rows": rows, "start": start, "stop": stop}},
+        "start": start,
+        "stop": stop,
+    }
+
+def _session_kind(folder):
+    """
+    "phone" for a SensorLogger session, "mpu" for an MPU6050 session, None for any other folder.
+    """
+    names = os.listdir(folder)
+    if "Metadata.csv" in names:
+        return "phone"
+    if "data.csv" in names:
+        return "mpu"
+    for name in names:
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(os.path.join(folder, name)) as z:
+                if "Metadata.csv" in z.namelist():
+                    return "phone"
+    return None
+
+class Catalog:
+    """
+    - Catalog of the sessions under one or more root folders e.g. Catalog(["SensorLoggerData", "MPUData"]).
+    - scan() only rescans session folders whose files have changed, and drops sessions which no longer exist.
+    - Sessions can be filtered with query, or listed as a dataframe with table.
+    """
+    def __init__(self, roots, path = None):
+        """
+        Args:
+            roots (list): Folders whose subfolders are sessions.
+            path (str, optional): Where the catalog is saved. Defaults to .cache/catalog.json in the first root.
+        """
+        self.roots = [roots] if isinstance(roots, str) else list(roots)
+        self.path = os.path.join(self.roots[0], CACHE_DIR, CATALOG_FILE) if path is None else path
+        self.sessions = {}  # Session folder to its entry
+        self.rescanned = []  # Folders scanned by the last call to scan
+        try:
+            with open(self.path) as f:
+                self.sessions = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        """
+        - Brings the catalog up to date and saves it.
+        Returns:
+            Catalog: self, so Catalog(roots).scan() can be chained.
+        """
+        sessions = {}
+        self.rescanned = []
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+                if not entry.is_dir() or entry.name.startswith("."):
+                    continue
+                folder = os.path.normpath(entry.path)
+                fingerprints = _fingerprints(folder)
+                previous = self.sessions.get(folder)
+                if previous is not None and previous["files"] == fingerprints:
+                    sessions[folder] = previous
+                    continue
+                kind = _session_kind(folder)
+                if kind is None:
+                    continue
+                session = scan_sensor_logger(folder) if kind == "phone" else scan_mpu(folder)
+                session.update(name=entry.name, folder=folder, files=fingerprints)
+                sessions[folder] = session
+                self.rescanned.append(folder)
+        self.sessions = sessions
+        self.save()
+        return self
+
+    def save(self):
+        """
+        Writes the catalog, see Files.atomic_write.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        Files.write_json(self.path, self.sessions, indent=1)
+
+    def query(self, kind = None, sensors = None, min_duration = None, device = None, predicate = None):
+        """
+        - Sessions which match every given condition.
+        Args:
+            kind (str, optional): "phone" or "mpu".
+            sensors (list, optional): Sensors the session must have recorded, with at least one row each.
+            min_duration (float, optional): Shortest duration in seconds.
+            device (str, optional): Device name e.g. "MPU6050".
+            predicate (callable, optional): Called with each session's entry, kept if it returns True.
+        Returns:
+            list: The entries of the matching sessions.
+        """
+        matches = []
+        for session in self.sessions.values():
+            if kind is not None and session["kind"] != kind:
+                continue
+            if device is not None and session["device"] != device:
+                continue
+            if sensors is not None and not all(session["sensors"].get(sensor, {}).get("rows") for sensor in sensors):
+                continue
+            if min_duration is not None and duration(session) < min_duration:
+                continue
+            if predicate is not None and not predicate(session):
+                continue
+            matches.append(session)
+        return matches
+
+    def table(self):
+        """
+        Returns:
+            pd.DataFrame: One row per session with its name, kind, device, duration, number of sensors and folder.
+        """
+        return pd.DataFrame([{
+            "name": session["name"],
+            "kind": session["kind"],
+            "device": session["device"],
+            "duration": duration(session),
+            "sensors": len(session["sensors"]),
+            "folder": session["folder"],
+        } for session in self.sessions.values()])
+
+def duration(session):
+    """
+    Returns:
+        float: Time in seconds between the first and last sample of a session's entry, 0 if it has no samples.
+    """
+    if session["start"] is None:
+        return 0.0
+    return session["stop"] - session["start"]
@@ -0,0 +1,132 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import Files
+
+# Reads logs recorded from the MPU6050 by the Arduino (see 9ArduinoCode).
+# Each row is t (millis), gx, gy, gz, ax, ay, az, temp where everything after t is a raw int16 reading.
+# Logs are converted once into packed binary records which are memory mapped on later reads,
+# 18 bytes per sample instead of the 64 bytes of float64 columns in a DataFrame.
+
+COLUMNS = ['t', 'gx', 'gy', 'gz', 'ax', 'ay', 'az', 'temp']
+RECORD_DTYPE = np.dtype([('t', '<i4'), ('gx', '<i2'), ('gy', '<i2'), ('gz', '<i2'),
+                         ('ax', '<i2'), ('ay', '<i2'), ('az', '<i2'), ('temp', '<i2')])
+CACHE_DIR = ".cache"
+
+def _to_records(values):
+    """
+    - Drops every malformed row in one pass: rows with a missing or non numeric value,
+      a value which isn't a whole number or one which doesn't fit in the record's type.
+    Args:
+        values (np.ndarray): The parsed rows (shape: (n, 8)).
+    Returns:
+        np.ndarray: The valid rows as records (shape: (m,)).
+    """
+    limits = np.array([[np.iinfo(RECORD_DTYPE[column]).min, np.iinfo(RECORD_DTYPE[column]).max] for column in COLUMNS])
+    with np.errstate(invalid='ignore'):
+        valid = np.all(np.isfinite(values) & (values == np.round(values)) & (values >= limits[:, 0]) & (values <= limits[:, 1]), axis=1)
+    values = values[valid]
+    records = np.empty(len(values), dtype=RECORD_DTYPE)
+    for i, column in enumerate(COLUMNS):
+        records[column] = values[:, i]
+    return records
+
+def read_csv(path, sep = ',', header = 0):
+    """
+    - Parses a log with every column read as float64 so garbled rows become nan rather than changing the column's type.
+    - Lines from a garbled serial read which can't be parsed as numbers are also treated as missing.
+    Args:
+        path (str or file): Path to the csv e.g. "MPUData/Pitch/data.csv", or an open file.
+        sep (str): Separator between values, the Arduino prints them separated by '/'. Defaults to ','.
+        header (int): Row number of the header, None if there isn't one. Defaults to 0.
+    Returns:
+        np.ndarray: The valid rows as records with the fields t, gx, gy, gz, ax, ay, az, temp (shape: (n,)).
+    """
+    dtypes = {column: np.float64 for column in COLUMNS}
+    try:
+        df = pd.read_csv(path, sep=sep, header=header, names=COLUMNS, dtype=dtypes, on_bad_lines='skip', encoding='latin-1')
+    except pd.errors.EmptyDataError:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    except ValueError:
+        # A value which isn't a number, slower since every value is read as text first
+        if hasattr(path, 'seek'):
+            path.seek(0)
+        df = pd.read_csv(path, sep=sep, header=header, names=COLUMNS, dtype=str, on_bad_lines='skip', encoding='latin-1')
+        df = pd.DataFrame({column: pd.to_numeric(df[column], errors='coerce') for column in COLUMNS})
+    return _to_records(df.to_numpy(dtype=np.float64))
+
+def save_binary(records, path):
+    """
+    Writes the records as a packed binary file which can be loaded with load_binary, see Files.atomic_write.
+    """
+    records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+    Files.atomic_write(path, records.tofile)
+
+def load_binary(path):
+    """
+    Memory maps a packed binary file of records.
+    Returns:
+        np.memmap: The records (shape: (n,)).
+    """
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+
+def read(path, cache = True):
+    """
+    - Reads a log, the first time it is converted to a packed binary file in the .cache folder next to it.
+    - Later reads memory map the binary file as long as the csv's size and modification time haven't changed.
+    Args:
+        path (str): Path to the csv e.g. "MPUData/Pitch/data.csv".
+        cache (bool): Whether to use the binary cache. Defaults to True.
+    Returns:
+        np.ndarray: The records with the fields t, gx, gy, gz, ax, ay, az, temp (shape: (n,)).
+    """
+    if not cache:
+        return read_csv(path)
+    folder, filename = os.path.split(path)
+    name = os.path.splitext(filename)[0]
+    cache_folder = os.path.join(folder, CACHE_DIR)
+    binary_path = os.path.join(cache_folder, f"{name}.bin")
+    meta_path = os.path.join(cache_folder, f"{name}.json")
+    fingerprint = Files.fingerprint(path)
+    try:
+        with open(meta_path) as f:
+            if json.load(f) == fingerprint:
+                return load_binary(binary_path)
+    except (OSError, ValueError):
+        pass
+
+    records = read_csv(path)
+    os.makedirs(cache_folder, exist_ok=True)
+    save_binary(records, binary_path)
+    # The metadata is written last, the cache is only used once it matches the csv
+    Files.write_json(meta_path, fingerprint)
+    return load_binary(binary_path)
+
+def convert(records, fields, offsets, scale, out = None, dtype = np.float64):
+    """
+    - Converts raw readings to SI units, out[:, i] = (records[fields[i]] - offsets[i]) * scale.
+    - The subtraction and scaling are written straight into out, column by column, so the only array created is out
+      (and not even that if it is supplied). Any sign change should be folded into scale.
+    Args:
+        records (np.ndarray): Records from read (shape: (n,)).
+        fields (list): Fields to convert e.g. ['ax', 'ay', 'az'].
+        offsets (list): Raw offset of each field, e.g. from calibration data.
+        scale (float or list): Conversion from raw units to SI units, either one for every field or one per field.
+        out (np.ndarray, optional): Array to write into (shape: (n, len(fields))). Defaults to None which creates one.
+        dtype (np.dtype): Type of the created array when out is None, float32 halves the memory. Defaults to np.float64.
+    Returns:
+        np.ndarray: The converted readings (shape: (n, len(fields))).
+    """
+    if out is None:
+        out = np.empty((len(records), len(fields)), dtype=dtype)
+    scales = np.broadcast_to(np.asarray(scale, dtype=out.dtype), (len(fields),))
+    for i, field in enumerate(fields):
+        column = out[:, i]
+        np.subtract(records[field], offsets[i], out=column, casting='same_kind')
+        column *= scales[i]
+    return out
@@ -1,4 +1,5 @@
 import AdvKalman
+import Quaternion
 import numpy as np
 
 def set_zero(signal):
@@ -14,28 +15,49 @@ def set_zero(signal):
     
     return np.column_stack((yaw, pitch, roll))
 
-def run(ws, as_, q = 10**-1.6, r = 10**-1.6, p = 0.1, ms = None, **kwargs):
-    # Simulation parameters
+X_I = np.array([1, 0, 0, 0]) # initial state vector
+
+def measure(as_, ms = None):
+    """
+    - The attitude measurements from the accelerometer (and magnetometer), the same for every q and r.
+    Returns:
+        np.ndarray: Euler angles from the accelerometer (shape: (3, n)).
+        np.ndarray: The measurements as quaternions (shape: (n, 4)).
+        np.ndarray: The measurement quaternions converted back to euler angles (shape: (n, 3)).
+    """
+    eulers_a = AdvKalman.get_attitude_measurment(as_, ms=ms)
+    zs_q = Quaternion.from_euler(eulers_a.T)  # shape (n, 4)
+    return eulers_a, zs_q, Quaternion.to_euler(zs_q)
+
+def fuse(ws, zs_q, q = 10**-1.6, r = 10**-1.6, p = 0.1, dt = 0.05, **kwargs):
+    """
+    - Uses the Kalman filter to fuse the gyroscope data with measurements from measure.
+    Returns:
+        np.ndarray: Kalman filtered euler angles (shape: (n, 3)).
+    """
     Q = np.identity(4) * q
     R = np.identity(4) * r
     p_i = np.identity(4) * p  # initial covariance matrix
     H = np.identity(4)
-    x_i = np.array([1, 0, 0, 0]) # initial state vector
+    quats = AdvKalman.filter_quaternions(zs_q, ws, X_I, p_i, dt, H=H, Q=Q, R=R, correct_mode=True, **kwargs)
+    return Quaternion.to_euler(quats)
+
+def integrate(ws, dt = 0.05):
+    """
+    Returns:
+        np.ndarray: Euler angles from integrating the gyroscope data only (shape: (n, 3)).
+    """
+    return AdvKalman.integrate_gyro(ws, X_I, dt=dt)
+
+def run(ws, as_, q = 10**-1.6, r = 10**-1.6, p = 0.1, ms = None, **kwargs):
+    dt = kwargs.pop('dt', 0.05)
     
+    # Calculate the euler parameters from the accelerometer data, once for both the measurements and the filter
+    eulers_a, zs_q, zs = measure(as_, ms=ms)
     
     # Use the Kalman filter to fuse the gyroscope and accelerometer data
-    filtered_signal, zs = AdvKalman.filter(as_, ws, x_i, p_i, H=H, Q=Q, R=R, correct_mode=True, ms=ms, **kwargs)
-
-    # Calculate the euler parameters from the accelerometer data
-    eulers_a = AdvKalman.get_attitude_measurment(as_, ms=ms)
+    filtered_signal = fuse(ws, zs_q, q=q, r=r, p=p, dt=dt, **kwargs)
     
-    # Calculate the euler angles using euler integration
-    eulers_g, _ = AdvKalman.filter(as_, ws, x_i, p_i, H=H, Q=Q, R=R, correct_mode=False, ms=ms, **kwargs)
-
-
+    # Calculate the euler angles by integrating the gyroscope data only
+    eulers_g = integrate(ws, dt=dt)
     return filtered_signal, eulers_a, eulers_g, zs
-
-
-
-
-
@@ -0,0 +1,189 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Quaternions are stored as [q0, q1, q2, q3] where q0 is the scalar part and q1, q2, q3 are the vector parts x, y, z.
+# Euler angles are stored as [psi, theta, phi] i.e. [yaw, pitch, roll].
+# Every function works on a single quaternion (shape: (4,)) or on many at once (shape: (n, 4)).
+
+def multiply(p, q):
+    """
+    Hamilton product p * q.
+    Args:
+        p (np.ndarray): Quaternions (shape: (4,) or (n, 4)).
+        q (np.ndarray): Quaternions (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: The products (shape: (4,) or (n, 4)).
+    """
+    p0, p1, p2, p3 = np.moveaxis(np.asarray(p, dtype=float), -1, 0)
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    return np.stack([
+        p0*q0 - p1*q1 - p2*q2 - p3*q3,
+        p0*q1 + p1*q0 + p2*q3 - p3*q2,
+        p0*q2 - p1*q3 + p2*q0 + p3*q1,
+        p0*q3 + p1*q2 - p2*q1 + p3*q0
+    ], axis=-1)
+
+def conjugate(q):
+    """
+    Conjugate of q, which is the inverse rotation for a unit quaternion.
+    Args:
+        q (np.ndarray): Quaternions (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: The conjugates (shape: (4,) or (n, 4)).
+    """
+    return np.asarray(q, dtype=float) * np.array([1, -1, -1, -1])
+
+def normalise(q):
+    """
+    Scales q to have unit length.
+    Args:
+        q (np.ndarray): Quaternions (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: Unit quaternions (shape: (4,) or (n, 4)).
+    """
+    q = np.asarray(q, dtype=float)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+def exp(v):
+    """
+    Exponential of the pure quaternion [0, v].
+    A rotation of angle |w| dt about w is exp(w * dt / 2).
+    Args:
+        v (np.ndarray): Vector parts (shape: (3,) or (n, 3)).
+    Returns:
+        np.ndarray: Unit quaternions (shape: (4,) or (n, 4)).
+    """
+    v = np.asarray(v, dtype=float)
+    angle = np.linalg.norm(v, axis=-1, keepdims=True)
+    # sin(angle) / angle written with np.sinc so that angle = 0 is handled
+    return np.concatenate([np.cos(angle), np.sinc(angle / np.pi) * v], axis=-1)
+
+def log(q):
+    """
+    Logarithm of a unit quaternion, the inverse of exp.
+    Args:
+        q (np.ndarray): Unit quaternions (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: Vector parts v such that exp(v) = q (shape: (3,) or (n, 3)).
+    """
+    q = np.asarray(q, dtype=float)
+    vector = q[..., 1:]
+    sin_angle = np.linalg.norm(vector, axis=-1, keepdims=True)
+    angle = np.arctan2(sin_angle, q[..., :1])
+    # angle / sin(angle), which tends to 1 as the angle goes to zero
+    scale = np.ones_like(angle)
+    np.divide(angle, sin_angle, out=scale, where=sin_angle > 0)
+    return scale * vector
+
+def align(q, reference):
+    """
+    - Handles the quaternion double cover, q and -q represent the same rotation.
+    - Flips the sign of q wherever it points away from the reference, so it gives the smaller angle difference.
+    Args:
+        q (np.ndarray): Quaternions (shape: (4,) or (n, 4)).
+        reference (np.ndarray): Quaternions to align with (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: q with its sign chosen so that q . reference >= 0 (shape: (4,) or (n, 4)).
+    """
+    q = np.asarray(q, dtype=float)
+    dot = np.sum(q * reference, axis=-1, keepdims=True)
+    return np.where(dot < 0, -q, q)
+
+def from_euler(euler_angles, intrinsic = False):
+    """
+    - Convert Euler angles to quaternions using the zyx convention.
+    - By default the rotations are about the fixed axes (extrinsic), the same as scipy's Rotation.from_euler('zyx').
+    - With intrinsic = True the rotations are about the rotating axes, i.e. yaw then pitch then roll.
+    Args:
+        euler_angles (np.ndarray): Euler angles [psi, theta, phi] (shape: (3,) or (n, 3)).
+        intrinsic (bool): Whether to rotate about the rotating axes.
+    Returns:
+        np.ndarray: Quaternions [q0, q1, q2, q3] (shape: (4,) or (n, 4)).
+    """
+    psi, theta, phi = np.moveaxis(np.asarray(euler_angles, dtype=float) / 2, -1, 0)
+    c_psi, s_psi = np.cos(psi), np.sin(psi)
+    c_theta, s_theta = np.cos(theta), np.sin(theta)
+    c_phi, s_phi = np.cos(phi), np.sin(phi)
+    # The two conventions only differ in the signs of the cross terms
+    sign = -1 if intrinsic else 1
+    return np.stack([
+        c_phi * c_theta * c_psi - sign * s_phi * s_theta * s_psi,
+        s_phi * c_theta * c_psi + sign * c_phi * s_theta * s_psi,
+        c_phi * s_theta * c_psi - sign * s_phi * c_theta * s_psi,
+        c_phi * c_theta * s_psi + sign * s_phi * s_theta * c_psi
+    ], axis=-1)
+
+def to_euler(q):
+    """
+    - Convert quaternions to Euler angles.
+    - Quaternions from the filter aren't exactly unit length so |sin(theta)| can be slightly above 1,
+      in which case the extra rotation is carried over the pole.
+    Args:
+        q (np.ndarray): Quaternions [q0, q1, q2, q3] (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: Euler angles [psi, theta, phi] (shape: (3,) or (n, 3)) where:
+                    - psi: Yaw angle
+                    - theta: Pitch angle
+                    - phi: Roll angle
+    """
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    psi = np.arctan2(2*(q1*q2+q0*q3),q0*q0+q1*q1-q2*q2-q3*q3)
+    phi = np.arctan2(2*(q2*q3+q0*q1),q0*q0-q1*q1-q2*q2+q3*q3)
+    sin_theta = -2 * (q1 * q3 - q0 * q2)
+    with np.errstate(invalid='ignore'):
+        # Each case is calculated for every quaternion then the correct one is picked
+        theta = np.where(sin_theta > 1, np.pi/2 - np.arcsin(2 - sin_theta), -np.pi/2 + np.arcsin(2 + sin_theta))
+        theta = np.where(np.abs(sin_theta) <= 1, np.arcsin(sin_theta), theta)
+    theta = (theta - np.pi/2) % np.pi - np.pi/2  # Normalize to [-pi/2, pi/2]
+    return np.stack([psi, theta, phi], axis=-1)
+
+def to_matrix(q):
+    """
+    Convert unit quaternions to rotation matrices.
+    Args:
+        q (np.ndarray): Unit quaternions (shape: (4,) or (n, 4)).
+    Returns:
+        np.ndarray: Rotation matrices, the columns are the rotated x, y and z axes (shape: (3, 3) or (n, 3, 3)).
+    """
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    return np.stack([
+        np.stack([1 - 2*(q2*q2 + q3*q3), 2*(q1*q2 - q0*q3), 2*(q1*q3 + q0*q2)], axis=-1),
+        np.stack([2*(q1*q2 + q0*q3), 1 - 2*(q1*q1 + q3*q3), 2*(q2*q3 - q0*q1)], axis=-1),
+        np.stack([2*(q1*q3 - q0*q2), 2*(q2*q3 + q0*q1), 1 - 2*(q1*q1 + q2*q2)], axis=-1)
+    ], axis=-2)
+
+def cumulative_product(qs, processes = None, chunk_size = 2**16):
+    """
+    - Running Hamilton product, the i-th output is qs[0] * qs[1] * ... * qs[i].
+    - The product is associative so it is calculated as a parallel prefix scan: at each of the log2(n) passes
+      every element is multiplied by the element offset places before it, with all the elements done at once.
+    - Long inputs are split into chunks which are scanned separately, then each chunk is multiplied by the
+      product of all the chunks before it. With processes > 1 the chunks are scanned in separate processes.
+    Args:
+        qs (np.ndarray): Quaternions (shape: (n, 4)).
+        processes (int, optional): Number of worker processes. Defaults to None which scans in this process.
+        chunk_size (int): Number of quaternions in each chunk. Defaults to 2**16.
+    Returns:
+        np.ndarray: The running products (shape: (n, 4)).
+    """
+    qs = np.array(qs, dtype=float)
+    n = len(qs)
+    if n > chunk_size:
+        chunks = [qs[i:i + chunk_size] for i in range(0, n, chunk_size)]
+        if processes is not None and processes > 1:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                chunks = list(executor.map(cumulative_product, chunks))
+        else:
+            chunks = [cumulative_product(chunk) for chunk in chunks]
+        # The last row of each chunk is the product of the whole chunk, so only one product is needed per chunk
+        carry = chunks[0][-1]
+        for i in range(1, len(chunks)):
+            chunks[i] = multiply(carry, chunks[i])
+            carry = chunks[i][-1]
+        return np.concatenate(chunks)
+    
+    offset = 1
+    while offset < n:
+        qs[offset:] = multiply(qs[:-offset], qs[offset:])
+        offset *= 2
+    return qs
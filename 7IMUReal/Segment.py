@@ -0,0 +1,220 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.constants as sc
+
+import AdvKalman
+import Quaternion
+import SensorLogger
+import StreamingKalman
+
+g = sc.g  # Acceleration due to gravity in m/s^2
+
+# Splits a session into segments, e.g. one per maneuver, and filters each segment on its own in a process pool.
+# Segments are either between the timestamps in the session's Annotation.csv or the motion between still periods.
+# Each segment's filters start from the attitude measured during the still period before it, so the segments
+# don't depend on each other and can be run in a process pool. Starting the pool takes about 0.1 s and filtering takes
+# about 5 us per sample, so the pool is only used for sessions of at least MIN_POOL_SAMPLES samples.
+
+AXES = ['yaw', 'pitch', 'roll']
+MIN_POOL_SAMPLES = 100000  # About half a second of filtering in one process
+
+def still(w, a, dt, window = 0.5, gyro_threshold = 0.2, accel_threshold = 0.5, min_duration = 0.5):
+    """
+    - Finds the samples where the sensor is still: the angular speed is small and the acceleration is close to g,
+      both averaged over a moving window.
+    - Still periods shorter than min_duration are ignored.
+    Args:
+        w (np.ndarray): Gyroscope data in rad/s (shape: (n, 3)).
+        a (np.ndarray): Accelerometer data in m/s^2 (shape: (n, 3)).
+        dt (float): Time step in seconds.
+        window (float): Length of the moving window in seconds. Defaults to 0.5.
+        gyro_threshold (float): Largest average angular speed in rad/s. Defaults to 0.2.
+        accel_threshold (float): Largest average difference between |a| and g in m/s^2. Defaults to 0.5.
+        min_duration (float): Shortest still period in seconds. Defaults to 0.5.
+    Returns:
+        np.ndarray: Whether each sample is still (shape: (n,)).
+    """
+    k = max(int(round(window / dt)), 1)
+    kernel = np.ones(k) / k
+    speed = np.convolve(np.linalg.norm(w, axis=1), kernel, mode='same')
+    shake = np.convolve(np.abs(np.linalg.norm(a, axis=1) - g), kernel, mode='same')
+    mask = (speed < gyro_threshold) & (shake < accel_threshold)
+    # Drop short still periods
+    starts, stops = _runs(mask)
+    for start, stop in zip(starts, stops):
+        if (stop - start) * dt < min_duration:
+            mask[start:stop] = False
+    return mask
+
+def _runs(mask):
+    """
+    Returns:
+        np.ndarray: Index of the first sample of each run of True values.
+        np.ndarray: Index after the last sample of each run.
+    """
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def segments_from_stillness(mask):
+    """
+    - A segment for each period of motion, starting with the still period before it.
+    Args:
+        mask (np.ndarray): Whether each sample is still, from still (shape: (n,)).
+    Returns:
+        list: (rest, start, stop) for each segment, the samples [rest, start) are still and [start, stop) are moving.
+    """
+    starts, stops = _runs(~mask)
+    rest_starts, rest_stops = _runs(mask)
+    segments = []
+    for start, stop in zip(starts, stops):
+        before = np.flatnonzero(rest_stops == start)
+        rest = rest_starts[before[0]] if len(before) else start
+        segments.append((int(rest), int(start), int(stop)))
+    return segments
+
+def segments_from_annotations(t, times, mask = None):
+    """
+    - A segment between each pair of annotations (and before the first and after the last), each starting
+      with the still samples at its beginning if there are any.
+    Args:
+        t (np.ndarray): Sample times in seconds (shape: (n,)).
+        times (np.ndarray): Annotation times in seconds.
+        mask (np.ndarray, optional): Whether each sample is still, from still (shape: (n,)).
+    Returns:
+        list: (rest, start, stop) for each segment, as for segments_from_stillness.
+    """
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(t, times), [len(t)]]))
+    segments = []
+    for rest, stop in zip(bounds[:-1], bounds[1:]):
+        start = rest
+        if mask is not None:
+            while start < stop and mask[start]:
+                start += 1
+            if start == stop:
+                start = rest
+        segments.append((int(rest), int(start), int(stop)))
+    return segments
+
+def _wrap(x):
+    """Wraps angles to [-pi, pi]."""
+    return (x + np.pi) % (2 * np.pi) - np.pi
+
+def _renormalise(x):
+    """
+    - Vectorised Analysis.renormalise, puts the phone's own [yaw, pitch, roll] in the ranges of the filters.
+    """
+    yaw, pitch, roll = x[:, 0].copy(), x[:, 1].copy(), x[:, 2].copy()
+    over = pitch > np.pi / 2
+    under = pitch < -np.pi / 2
+    pitch[over] = np.pi - pitch[over]
+    pitch[under] = -np.pi - pitch[under]
+    flipped = over | under
+    yaw[flipped] += np.pi
+    roll[flipped] += np.pi
+    return np.column_stack([_wrap(yaw), pitch, _wrap(roll)])
+
+def _rmse(x, truth):
+    """Root mean square of the wrapped difference for each axis, ignoring nan."""
+    return np.sqrt(np.nanmean(_wrap(x - truth) ** 2, axis=0))
+
+def process_segment(task):
+    """
+    - Filters one segment, run in a worker process by process.
+    - The fused and gyroscope only filters start from the average measured attitude over the still samples [rest, start),
+      with the error covariance r / (number of still samples). Without still samples they start from the first measurement.
+    Args:
+        task (dict): The segment's samples and the filter parameters, see process.
+    Returns:
+        dict: The segment's row of the metrics table.
+    """
+    start_time = time.perf_counter()
+    w, a, m, t = task['w'], task['a'], task['m'], task['t']
+    rest, q, r, dt = task['rest'], task['q'], task['r'], task['dt']
+    eulers = StreamingKalman.measurements(a, m, task['theta_0'], task['phi_0'], task['psi_0'])
+    zs_q = Quaternion.from_euler(eulers)
+    resting = zs_q[:max(rest, 1)]
+    x_i = Quaternion.normalise(Quaternion.align(resting, resting[0]).mean(axis=0))
+    p = r / max(rest, 1)
+
+    kf = StreamingKalman.OrientationFilter(q=q, r=r, p=p, dt=dt, x_i=x_i)
+    kf.theta_0, kf.phi_0, kf.psi_0 = task['theta_0'], task['phi_0'], task['psi_0']
+    moving = slice(rest, None)
+    theta = kf.update_batch(w[moving], a[moving], None if m is None else m[moving])
+    theta_g = AdvKalman.integrate_gyro(w[moving], x_i, dt=dt)
+    theta_a = eulers[moving]
+
+    row = {
+        'segment': task['segment'],
+        'start': float(t[rest]) if len(t) > rest else float(t[0]),
+        'stop': float(t[-1]),
+        'duration': float(t[-1] - t[rest]) if len(t) > rest else 0.0,
+        'samples': len(t) - rest,
+        'still_samples': rest,
+    }
+    truth = task['truth']
+    if truth is not None:
+        truth = truth[moving]
+        for name, x in (('fused', theta), ('gyro', theta_g), ('accel', theta_a)):
+            for axis, value in zip(AXES, _rmse(x, truth)):
+                row[f'rmse_{name}_{axis}'] = value
+    else:
+        # No reference attitude, the difference between the filter and the measurements instead
+        for axis, value in zip(AXES, _rmse(theta, theta_a)):
+            row[f'residual_{axis}'] = value
+    row['time'] = time.perf_counter() - start_time
+    return row
+
+def process(session, method = "stillness", processes = None, **kwargs):
+    """
+    - Splits a session into segments and filters each in a process pool, see process_segment.
+    Args:
+        session (Session.Session): The session, e.g. Session.PhoneSession("SensorLoggerData/PitchRoll").
+        method (str): "stillness" for a segment per period of motion, "annotations" to split at the times in Annotation.csv
+                      (the whole session is one segment if there are none). Defaults to "stillness".
+        processes (int, optional): Number of worker processes. Defaults to None which uses every core, 1 runs in this process.
+                                   Sessions shorter than MIN_POOL_SAMPLES always run in this process.
+        **kwargs: Passed to still, e.g. gyro_threshold.
+    Returns:
+        pd.DataFrame: One row per segment with its times, number of samples and the root mean square error of each filter
+                      against the phone's own orientation (or the residual against the measurements for the MPU6050).
+    """
+    if method not in ("stillness", "annotations"):
+        raise ValueError("method must be 'stillness' or 'annotations'")
+    data = session.load()
+    t, w, a, m = data['t'], data['w'], data['a'], data['m']
+    dt = np.diff(t).mean()
+    mask = still(w, a, dt, **kwargs)
+    if method == "stillness":
+        segments = segments_from_stillness(mask)
+    else:
+        segments = segments_from_annotations(t, SensorLogger.read_annotations(session.folder), mask)
+
+    # The measured angles are relative to the first sample of the session, the same as a full run
+    reference = StreamingKalman.OrientationFilter()
+    reference.update_batch(w[:1], a[:1], None if m is None else m[:1])
+    truth = None
+    if data['orientation'] is not None:
+        # Same conversion as AnalysePhone, pitch and roll are swapped for the phones real data
+        yaw, pitch, roll = data['orientation'].T
+        truth = _renormalise(np.column_stack([-(yaw - yaw[0]), (roll - roll[0]), -(pitch - pitch[0])]))
+
+    tasks = []
+    for i, (rest, start, stop) in enumerate(segments):
+        part = slice(rest, stop)
+        tasks.append({
+            'segment': i, 'rest': start - rest, 't': t[part], 'w': w[part], 'a': a[part],
+            'm': None if m is None else m[part], 'truth': None if truth is None else truth[part],
+            'q': session.q, 'r': session.r, 'dt': dt,
+            'theta_0': reference.theta_0, 'phi_0': reference.phi_0, 'psi_0': reference.psi_0,
+        })
+    processes = os.cpu_count() if processes is None else processes
+    if processes > 1 and len(tasks) > 1 and len(t) >= MIN_POOL_SAMPLES:
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+            rows = list(executor.map(process_segment, tasks))
+    else:
+        rows = [process_segment(task) for task in tasks]
+    return pd.DataFrame(rows)
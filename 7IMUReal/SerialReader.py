@@ -0,0 +1,290 @@
+import io
+import threading
+import time
+
+import numpy as np
+
+import MPULog
+
+# Reads the MPU6050 stream from the Arduino (see 9ArduinoCode) live, on a background thread.
+# The port can be anything with a read(n) method which returns bytes: a serial port from pyserial,
+# a pseudo terminal from os.openpty or a recorded file being replayed.
+
+class RingBuffer:
+    """
+    - Fixed size buffer of the latest records, the oldest are overwritten once it is full.
+    - Every record is written twice, capacity apart, so the latest n records are always one contiguous slice
+      and latest(n) can return a view rather than a copy.
+    """
+    def __init__(self, capacity, dtype = MPULog.RECORD_DTYPE):
+        """
+        Args:
+            capacity (int): Number of records kept.
+            dtype (np.dtype): Type of each record. Defaults to MPULog.RECORD_DTYPE.
+        """
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.count = 0  # Number of records pushed so far
+
+    def push(self, records):
+        """
+        - Adds records to the buffer, only the last capacity of them are kept but all of them are counted.
+        """
+        total = len(records)
+        records = records[-self.capacity:]
+        n = len(records)
+        # The kept records go where they would have been if every record had been written
+        positions = (self.count + total - n + np.arange(n)) % self.capacity
+        self.data[positions] = records
+        self.data[positions + self.capacity] = records
+        self.count += total
+
+    def latest(self, n = None):
+        """
+        - The latest n records, oldest first, without copying.
+        - The view is of the buffer itself so it will change once more than capacity - n records are pushed,
+          copy it if it needs to be kept.
+        Args:
+            n (int, optional): Number of records. Defaults to None which gives every record in the buffer.
+        Returns:
+            np.ndarray: The records (shape: (min(n, count, capacity),)).
+        """
+        available = min(self.count, self.capacity)
+        n = available if n is None else min(n, available)
+        end = self.count % self.capacity + self.capacity
+        return self.data[end - n:end]
+
+class LineDecoder:
+    """
+    - Decodes the Arduino's text lines, t/gx/gy/gz/ax/ay/az/temp, in bulk.
+    - Bytes after the last newline are kept until the rest of the line arrives.
+    - Garbled lines, including the header, are dropped and counted.
+    """
+    def __init__(self, sep = '/'):
+        self.sep = sep
+        self.remainder = b""
+        self.dropped = 0  # Number of lines which couldn't be parsed
+
+    def feed(self, data):
+        """
+        Args:
+            data (bytes): The next bytes read from the port.
+        Returns:
+            np.ndarray: Records for every complete line (shape: (n,)).
+        """
+        data = self.remainder + data
+        end = data.rfind(b"\n") + 1
+        self.remainder = data[end:]
+        if end == 0:
+            return np.empty(0, dtype=MPULog.RECORD_DTYPE)
+        lines = data[:end]
+        records = MPULog.read_csv(io.BytesIO(lines), sep=self.sep, header=None)
+        # Blank lines are skipped by the parser so aren't counted, e.g. a terminal turning \r\n into \n\n
+        self.dropped += sum(1 for line in lines.splitlines() if line.strip()) - len(records)
+        return records
+
+# Binary frames sent when BINARY_MODE is set in the sketch, 21 bytes per sample instead of about 60
+SYNC = b"\xa5\x5a"
+FRAME_DTYPE = np.dtype([('sync', 'u1', 2), ('t', '<u4'), ('gx', '<i2'), ('gy', '<i2'), ('gz', '<i2'),
+                        ('ax', '<i2'), ('ay', '<i2'), ('az', '<i2'), ('temp', '<i2'), ('checksum', 'u1')])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+def encode_frames(records):
+    """
+    - Packs records into binary frames the same way as sendFrame in the sketch.
+    Args:
+        records (np.ndarray): Records with the fields t, gx, gy, gz, ax, ay, az, temp (shape: (n,)).
+    Returns:
+        bytes: The frames one after the other.
+    """
+    frames = np.zeros(len(records), dtype=FRAME_DTYPE)
+    frames['sync'] = np.frombuffer(SYNC, dtype=np.uint8)
+    for column in MPULog.COLUMNS:
+        frames[column] = records[column]
+    data = frames.view(np.uint8).reshape(-1, FRAME_SIZE)
+    frames['checksum'] = data[:, 2:-1].sum(axis=1)
+    return frames.tobytes()
+
+class FrameDecoder:
+    """
+    - Decodes binary frames from bytes read in chunks of any size, with the same feed interface as LineDecoder.
+    - Every position where the sync bytes appear is checked at once with np.frombuffer, frames whose checksum
+      doesn't match are rejected and counted, then decoding carries on from the next sync bytes.
+    - The checksum is one byte so about 1 in 256 corrupted frames still pass it.
+    - Bytes at the end which could be the start of a frame are kept until the rest arrives.
+    """
+    def __init__(self):
+        self.remainder = b""
+        self.dropped = 0  # Number of frames rejected because of a bad checksum
+
+    def feed(self, data):
+        """
+        Args:
+            data (bytes): The next bytes read from the port.
+        Returns:
+            np.ndarray: Records for every valid frame (shape: (n,)).
+        """
+        data = self.remainder + data
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        n = len(buffer)
+        # Every complete frame which starts with the sync bytes
+        starts = np.flatnonzero((buffer[:-1] == SYNC[0]) & (buffer[1:] == SYNC[1]))
+        starts = starts[starts + FRAME_SIZE <= n]
+        frames = buffer[starts[:, np.newaxis] + np.arange(FRAME_SIZE)]
+        valid = (frames[:, 2:-1].sum(axis=1) & 0xFF) == frames[:, -1]
+
+        good = starts[valid]
+        if np.any(np.diff(good) < FRAME_SIZE):
+            # The sync bytes appeared inside a frame and happened to pass the checksum, keep the first of any overlapping frames
+            keep = np.zeros(len(good), dtype=bool)
+            end = -1
+            for i, start in enumerate(good):
+                if start >= end:
+                    keep[i] = True
+                    end = start + FRAME_SIZE
+            valid[np.flatnonzero(valid)[~keep]] = False
+            good = good[keep]
+        # Rejected frames are counted unless the sync bytes were just part of a valid frame
+        rejected = starts[~valid]
+        if len(good):
+            previous = np.maximum(np.searchsorted(good, rejected, side='right') - 1, 0)
+            rejected = rejected[(rejected < good[previous]) | (rejected >= good[previous] + FRAME_SIZE)]
+        self.dropped += len(rejected)
+
+        end = good[-1] + FRAME_SIZE if len(good) else 0
+        self.remainder = data[max(end, n - (FRAME_SIZE - 1)):]
+        decoded = np.ascontiguousarray(frames[valid]).view(FRAME_DTYPE).reshape(-1)
+        records = np.empty(len(decoded), dtype=MPULog.RECORD_DTYPE)
+        for column in MPULog.COLUMNS:
+            records[column] = decoded[column]
+        return records
+
+def simulate_stream(records, corruption = 0.0, rng = None):
+    """
+    - Byte stream the sketch would send in binary mode, for testing and benchmarking FrameDecoder without the Arduino.
+    Args:
+        records (np.ndarray): Records with the fields t, gx, gy, gz, ax, ay, az, temp (shape: (n,)).
+        corruption (float): Fraction of frames which have one byte changed or removed. Defaults to 0.
+        rng (np.random.Generator, optional): Random number generator for the corruption.
+    Returns:
+        bytes: The stream.
+        np.ndarray: Whether each frame was left intact (shape: (n,)).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    frames = np.frombuffer(encode_frames(records), dtype=np.uint8).reshape(-1, FRAME_SIZE).copy()
+    intact = rng.random(len(frames)) >= corruption
+    pieces = []
+    for i, frame in enumerate(frames):
+        frame = frame.tobytes()
+        if not intact[i]:
+            j = rng.integers(FRAME_SIZE)
+            if rng.random() < 0.5:
+                # Changed byte
+                frame = frame[:j] + bytes([(frame[j] + rng.integers(1, 256)) % 256]) + frame[j + 1:]
+            else:
+                # Lost byte
+                frame = frame[:j] + frame[j + 1:]
+        pieces.append(frame)
+    return b"".join(pieces), intact
+
+def open_serial(port, baudrate = 115200, timeout = 0.1):
+    """
+    Opens a serial port with pyserial, which is only needed when reading from real hardware.
+    """
+    try:
+        import serial
+    except ImportError:
+        raise ImportError("Reading from a serial port needs pyserial (pip install pyserial)")
+    return serial.Serial(port, baudrate=baudrate, timeout=timeout)
+
+class SerialReader:
+    """
+    - Reads from the port on a background thread and pushes the decoded records into a ring buffer.
+    - latest(n) gives the filters and plots the latest n samples at any time.
+    """
+    def __init__(self, port, capacity = 2**16, decoder = None, chunk_size = 4096, stop_at_eof = False, poll_interval = 0.01):
+        """
+        Args:
+            port (str or file): Name of a serial port e.g. "/dev/ttyACM0", or anything with a read(n) method which returns bytes.
+            capacity (int): Number of samples kept in the ring buffer. Defaults to 2**16.
+            decoder (optional): Turns bytes into records with feed(data), FrameDecoder() for the sketch's binary mode.
+                                Defaults to LineDecoder().
+            chunk_size (int): Largest number of bytes read at once. Defaults to 4096.
+            stop_at_eof (bool): Whether to stop when read returns no bytes, for replaying a file. Defaults to False.
+            poll_interval (float): Seconds to wait after a read which returns no bytes. Defaults to 0.01.
+        """
+        self.port = open_serial(port) if isinstance(port, str) else port
+        self.buffer = RingBuffer(capacity)
+        self.decoder = LineDecoder() if decoder is None else decoder
+        self.chunk_size = chunk_size
+        self.stop_at_eof = stop_at_eof
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None  # Exception which stopped the thread, if any
+
+    @property
+    def count(self):
+        """int: Number of samples read so far."""
+        return self.buffer.count
+
+    @property
+    def dropped(self):
+        """int: Number of lines or frames which couldn't be decoded."""
+        return self.decoder.dropped
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                data = self.port.read(self.chunk_size)
+                if not data:
+                    if self.stop_at_eof:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                records = self.decoder.feed(data)
+                if len(records):
+                    with self.lock:
+                        self.buffer.push(records)
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        """
+        Starts reading on a background thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout = None):
+        """
+        Stops the background thread, it finishes once its current read returns.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def join(self, timeout = None):
+        """
+        Waits for the background thread to finish, e.g. at the end of a replayed file.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def latest(self, n = None):
+        """
+        The latest n samples, see RingBuffer.latest.
+        Returns:
+            np.ndarray: The records with the fields t, gx, gy, gz, ax, ay, az, temp (shape: (n,)).
+        """
+        with self.lock:
+            return self.buffer.latest(n)
@@ -0,0 +1,296 @@
+import abc
+import bisect
+import hashlib
+import json
+import os
+
+import numpy as np
+import scipy.constants as sc
+
+import AdvKalman
+import Files
+import MPULog
+import Quaternion
+import SensorLogger
+import StreamingKalman
+
+g = sc.g  # Acceleration due to gravity in m/s^2
+
+# used for concersion between MPU6050 units for velocity and position
+LSB2g = 16384**-1
+LSB2w = 131**-1
+
+# Lazy sessions which load and filter only a time window, e.g. MPUSession("MPUData/Pitch").slice(20, 40).
+# The samples are memory mapped from the binary caches of MPULog and SensorLogger and the window is found by binary search,
+# so only the pages holding the window are read.
+# The filters are started from the nearest checkpoint before the window, the state of the fused and gyroscope only
+# filters saved every checkpoint_every samples of a full run, so the window matches the same window of a full run.
+# The checkpoints depend on q, r and p so they are saved in the session's .cache folder for each set of parameters,
+# the first slice with new parameters makes one pass of the filter over the whole session to create them.
+
+CACHE_DIR = ".cache"
+
+class Window:
+    """
+    - The samples and filter outputs for a time window, with the same names as the attributes of AnalyseMPU.
+    """
+    def __init__(self, t, dt, w, a, m, theta, theta_a, theta_g, zs, orientation = None):
+        self.t = t  # Time in seconds (shape: (n,))
+        self.dt = dt  # Time step of the whole session
+        self.w = w  # Gyroscope in rad/s (shape: (n, 3))
+        self.a = a  # Accelerometer in m/s^2 (shape: (n, 3))
+        self.m = m  # Magnetometer, None for the MPU6050 (shape: (n, 3))
+        self.theta = theta  # Kalman filtered attitude [psi, theta, phi] (shape: (n, 3))
+        self.theta_a = theta_a  # Accelerometer (and magnetometer) attitude (shape: (3, n))
+        self.theta_g = theta_g  # Gyroscope only attitude (shape: (n, 3))
+        self.zs = zs  # Measurements as Euler angles (shape: (n, 3))
+        self.orientation = orientation  # The phone's own yaw, pitch, roll, None for the MPU6050 (shape: (n, 3))
+
+class Session(abc.ABC):
+    """
+    - Abstract base class for MPUSession and PhoneSession, which say how to read a range of samples.
+    - Samples are numbered by their row in the reference stream (the MPU6050 log or the phone's Gravity sensor).
+    """
+    time_scale = 1.0  # Converts the reference stream's times to seconds
+
+    def __init__(self, folder, q = 10**-1.6, r = 10**-1.6, p = 0.1, checkpoint_every = 1024):
+        """
+        Args:
+            folder (str): Path to the session folder.
+            q (float): Process noise covariance for the Kalman filter. Default is 10**-1.6.
+            r (float): Measurement noise covariance for the Kalman filter. Default is 10**-1.6.
+            p (float): Initial error covariance for the Kalman filter. Default is 0.1.
+            checkpoint_every (int): Number of samples between checkpoints, a slice runs the filter over at most
+                                    this many samples before the window. Defaults to 1024.
+        """
+        self.folder = folder
+        self.q = q
+        self.r = r
+        self.p = p
+        self.checkpoint_every = checkpoint_every
+        self._checkpoints = {}
+
+    @abc.abstractmethod
+    def _times(self):
+        """Times of the reference stream, in its own units, memory mapped."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _load(self, start, stop):
+        """
+        Returns:
+            dict: t, w, a, m, orientation and rows (the reference row of each sample) for the reference rows [start, stop).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _sources(self):
+        """Files the samples are read from, the checkpoints are rebuilt when any of them change."""
+        raise NotImplementedError
+
+    def __len__(self):
+        """Number of samples in the reference stream."""
+        return len(self._times())
+
+    def load(self, start = 0, stop = None):
+        """
+        - Loads the samples without filtering them.
+        Args:
+            start (int): First reference row. Defaults to 0.
+            stop (int, optional): Reference row after the last. Defaults to None, the end of the session.
+        Returns:
+            dict: t, w, a, m, orientation and rows (the reference row of each sample) for the reference rows [start, stop).
+        """
+        return self._load(start, len(self) if stop is None else stop)
+
+    @property
+    def start(self):
+        """float: Time of the first sample in seconds."""
+        return float(self._times()[0]) * self.time_scale
+
+    @property
+    def stop(self):
+        """float: Time of the last sample in seconds."""
+        return float(self._times()[-1]) * self.time_scale
+
+    def _key(self):
+        """Name of the checkpoint file for the current data and parameters."""
+        fingerprints = {os.path.basename(path): Files.fingerprint(path) for path in self._sources()}
+        key = json.dumps([fingerprints, self.q, self.r, self.p, self.checkpoint_every], sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def checkpoints(self):
+        """
+        - The state of both filters at every checkpoint, loaded from the .cache folder or created by one full run.
+        Returns:
+            dict: rows (reference row of each checkpoint), x and x_g (state quaternions of the fused and gyroscope only
+                  filters before that row), p (error covariance), dt and the reference angles theta_0, phi_0, psi_0.
+        """
+        key = self._key()
+        if key in self._checkpoints:
+            return self._checkpoints[key]
+        path = os.path.join(self.folder, CACHE_DIR, "checkpoints", f"{key}.npz")
+        try:
+            with np.load(path) as f:
+                checkpoints = {name: f[name] for name in f.files}
+        except (OSError, ValueError):
+            checkpoints = self._run_checkpoints()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Files.atomic_write(path, lambda f: np.savez(f, **checkpoints))
+        self._checkpoints[key] = checkpoints
+        return checkpoints
+
+    def _run_checkpoints(self):
+        """
+        Runs both filters over the whole session, saving their state every checkpoint_every samples.
+        """
+        data = self.load()
+        ws, as_, ms = data['w'], data['a'], data['m']
+        n = len(ws)
+        dt = np.diff(data['t']).mean()
+        starts = np.arange(0, n, self.checkpoint_every)
+        x = np.empty((len(starts), 4))
+        p = np.empty(len(starts))
+        kf = StreamingKalman.OrientationFilter(q=self.q, r=self.r, p=self.p, dt=dt)
+        for i, start in enumerate(starts):
+            x[i] = kf.x
+            p[i] = kf.p
+            # The first block also sets the reference angles from the first sample
+            block = slice(start, start + self.checkpoint_every)
+            kf.update_batch(ws[block], as_[block], None if ms is None else ms[block])
+
+        # The gyroscope only states are the running product used by AdvKalman.integrate_gyro
+        steps = np.empty((n + 1, 4))
+        steps[0] = [1, 0, 0, 0]
+        steps[1:, 0] = 1
+        steps[1:, 1:] = ws
+        steps[1:, 1:] *= 0.5 * dt
+        x_g = Quaternion.cumulative_product(steps)[starts]
+        return {
+            "rows": data['rows'][starts], "x": x, "p": p, "x_g": x_g, "dt": np.float64(dt),
+            "theta_0": np.float64(kf.theta_0), "phi_0": np.float64(kf.phi_0),
+            "psi_0": np.float64(np.nan if kf.psi_0 is None else kf.psi_0),
+        }
+
+    def slice(self, t0, t1):
+        """
+        - Loads and filters the samples with t0 <= t <= t1.
+        - The filters are run from the last checkpoint before t0, so the cost is proportional to the window
+          (once the checkpoints exist).
+        Args:
+            t0 (float): Start of the window in seconds.
+            t1 (float): End of the window in seconds.
+        Returns:
+            Window: The window's samples and filter outputs.
+        """
+        times = self._times()
+        start = bisect.bisect_left(times, t0 / self.time_scale)
+        stop = bisect.bisect_right(times, t1 / self.time_scale)
+        checkpoints = self.checkpoints()
+        c = max(int(np.searchsorted(checkpoints['rows'], start, side='right')) - 1, 0)
+        data = self._load(int(checkpoints['rows'][c]), stop)
+        ws, as_, ms = data['w'], data['a'], data['m']
+        dt = float(checkpoints['dt'])
+        theta_0, phi_0 = float(checkpoints['theta_0']), float(checkpoints['phi_0'])
+        psi_0 = None if np.isnan(checkpoints['psi_0']) else float(checkpoints['psi_0'])
+
+        kf = StreamingKalman.OrientationFilter(q=self.q, r=self.r, p=float(checkpoints['p'][c]), dt=dt, x_i=checkpoints['x'][c])
+        kf.theta_0, kf.phi_0, kf.psi_0 = theta_0, phi_0, psi_0
+        theta = kf.update_batch(ws, as_, ms)
+        theta_g = AdvKalman.integrate_gyro(ws, checkpoints['x_g'][c], dt=dt)
+        eulers_a = StreamingKalman.measurements(as_, ms, theta_0, phi_0, psi_0)
+        zs = Quaternion.to_euler(Quaternion.from_euler(eulers_a))
+
+        keep = data['rows'] >= start
+        orientation = None if data['orientation'] is None else data['orientation'][keep]
+        return Window(data['t'][keep], dt, ws[keep], as_[keep], None if ms is None else ms[keep],
+                      theta[keep], eulers_a[keep].T, theta_g[keep], zs[keep], orientation)
+
+class MPUSession(Session):
+    """
+    - An MPU6050 session folder with data.csv and calibration.csv, e.g. "MPUData/Pitch".
+    - The same conversion and calibration as AnalyseMPU.
+    """
+    time_scale = 1e-3  # t is in milliseconds
+
+    def __init__(self, folder, q = 10**-1.6, r = 10**-1.6, p = 0.1, checkpoint_every = 1024):
+        super().__init__(folder, q=q, r=r, p=p, checkpoint_every=checkpoint_every)
+        self.records = MPULog.read(os.path.join(folder, "data.csv"))
+        calibration = MPULog.read(os.path.join(folder, "calibration.csv"))
+        self.offsets = (calibration['ax'].mean(), calibration['ay'].mean(), calibration['az'].mean() - (1/LSB2g),
+                        calibration['gx'].mean(), calibration['gy'].mean(), calibration['gz'].mean())
+
+    def _times(self):
+        return self.records['t']
+
+    def _sources(self):
+        return [os.path.join(self.folder, "data.csv"), os.path.join(self.folder, "calibration.csv")]
+
+    def _load(self, start, stop):
+        records = self.records[start:stop]
+        ax_off, ay_off, az_off, gx_off, gy_off, gz_off = self.offsets
+        return {
+            "t": records['t'] / 1000,
+            "w": MPULog.convert(records, ['gx', 'gy', 'gz'], [gx_off, gy_off, gz_off], LSB2w * (np.pi / 180)),
+            "a": MPULog.convert(records, ['ax', 'ay', 'az'], [ax_off, ay_off, az_off], -LSB2g * g),
+            "m": None,
+            "orientation": None,
+            "rows": np.arange(start, start + len(records)),
+        }
+
+class PhoneSession(Session):
+    """
+    - A SensorLogger session folder, e.g. "SensorLoggerData/PitchRoll".
+    - The same sensors and alignment onto the Gravity timestamps as AnalysePhone.
+    """
+    sensors = ["Gravity", "Gyroscope", "Magnetometer", "Orientation"]
+    margin = 1.0  # Seconds either side of a window read from the other sensors, more than the alignment tolerance
+
+    def __init__(self, folder, q = 10**-1.6, r = 10**-1.6, p = 0.1, checkpoint_every = 1024, tolerance = 0.01):
+        super().__init__(folder, q=q, r=r, p=p, checkpoint_every=checkpoint_every)
+        self.tolerance = tolerance
+        self.data = SensorLogger.read_sensors(folder, self.sensors)
+
+    def _times(self):
+        return self.data["Gravity"]['seconds_elapsed']
+
+    def _sources(self):
+        return [SensorLogger.find_source(self.folder, sensor) for sensor in self.sensors]
+
+    def _load(self, start, stop):
+        times = self._times()
+        windows = {"Gravity": {column: values[start:stop] for column, values in self.data["Gravity"].items()}}
+        if stop > start:
+            t_start, t_stop = times[start] - self.margin, times[stop - 1] + self.margin
+        else:
+            t_start, t_stop = 0, -1
+        for sensor in self.sensors[1:]:
+            t = self.data[sensor]['seconds_elapsed']
+            i, j = np.searchsorted(t, t_start), np.searchsorted(t, t_stop, side='right')
+            windows[sensor] = {column: values[i:j] for column, values in self.data[sensor].items()}
+        if any(len(window['seconds_elapsed']) < 2 for window in windows.values()):
+            empty = np.empty((0, 3))
+            return {"t": np.empty(0), "w": empty, "a": empty, "m": empty, "orientation": empty, "rows": np.empty(0, dtype=int)}
+        t, aligned, _ = SensorLogger.align(windows, columns={"Orientation": ["yaw", "pitch", "roll"]},
+                                           reference="Gravity", tolerance=self.tolerance)
+        return {
+            "t": t,
+            "w": aligned["Gyroscope"],
+            "a": -aligned["Gravity"],  # a has the opposite sign to match our model
+            "m": aligned["Magnetometer"],
+            "orientation": aligned["Orientation"],
+            "rows": start + np.searchsorted(windows["Gravity"]['seconds_elapsed'], t),
+        }
+
+def open_session(folder, **kwargs):
+    """
+    - Opens a session folder as a PhoneSession if it has a SensorLogger Metadata.csv or zip, otherwise as an MPUSession.
+    Args:
+        folder (str): Path to the session folder.
+        **kwargs: Passed to the session, e.g. q and r.
+    Returns:
+        Session: The session.
+    """
+    if os.path.exists(os.path.join(folder, "data.csv")):
+        return MPUSession(folder, **kwargs)
+    return PhoneSession(folder, **kwargs)
@@ -0,0 +1,191 @@
+import math
+
+import numpy as np
+import scipy.constants as sc
+
+import Quaternion
+
+g = sc.g  # Acceleration due to gravity in m/s^2
+
+class OrientationFilter:
+    """
+    - Online version of the orientation kalman filter, samples are pushed in one at a time as they arrive.
+    - Gives the same attitude as OrientationKalman.run / AdvKalman.filter when fed the same data.
+    - Like AdvKalman.filter_isotropic, H = I and P, Q and R are multiples of the identity, so the state is
+      4 floats for x and 3 floats for P, Q and R.
+    """
+    __slots__ = ("x0", "x1", "x2", "x3", "p", "q", "r", "dt", "correct_mode", "theta_0", "phi_0", "psi_0")
+
+    def __init__(self, q = 10**-1.6, r = 10**-1.6, p = 0.1, dt = 0.05, x_i = (1, 0, 0, 0), correct_mode = True):
+        """
+        Args:
+            q (float): Process noise covariance, Q = q * I. Default is 10**-1.6.
+            r (float): Measurement noise covariance, R = r * I. Default is 10**-1.6.
+            p (float): Initial error covariance, p_i = p * I. Default is 0.1.
+            dt (float): Time step in seconds. Default is 0.05.
+            x_i (tuple): Initial state quaternion [q0, q1, q2, q3]. Default is (1, 0, 0, 0).
+            correct_mode (bool): If True, perform correction step; if False, only predict (gyroscope only).
+        """
+        self.x0, self.x1, self.x2, self.x3 = (float(v) for v in x_i)
+        self.p = float(p)
+        self.q = float(q)
+        self.r = float(r)
+        self.dt = float(dt)
+        self.correct_mode = correct_mode
+        # get_attitude_measurment measures the angles relative to the first sample, these are set by the first update
+        self.theta_0 = None
+        self.phi_0 = None
+        self.psi_0 = None
+
+    @property
+    def x(self):
+        """np.ndarray: The current state quaternion [q0, q1, q2, q3] (shape: (4,))."""
+        return np.array([self.x0, self.x1, self.x2, self.x3])
+
+    @property
+    def attitude(self):
+        """tuple: The current Euler angles (psi, theta, phi) i.e. (yaw, pitch, roll)."""
+        return _to_euler(self.x0, self.x1, self.x2, self.x3)
+
+    def _measurement(self, a, m):
+        """
+        - Same as AdvKalman.get_attitude_measurment followed by Quaternion.from_euler for a single sample.
+        Returns:
+            tuple: The measurement quaternion (z0, z1, z2, z3).
+        """
+        theta = -math.asin(min(max(a[0] / g, -1.0), 1.0))
+        phi = math.asin(min(max(-a[1] / (g * math.cos(theta)), -1.0), 1.0))
+        if self.theta_0 is None:
+            self.theta_0, self.phi_0 = theta, phi
+        theta = theta - self.theta_0
+        phi = phi - self.phi_0
+        if m is None:
+            psi = 0.0
+        else:
+            # Tilt compensated heading
+            Xh = m[0] * math.cos(theta) + m[1] * math.sin(theta) * math.sin(phi) + m[2] * math.sin(theta) * math.cos(phi)
+            Yh = m[1] * math.cos(phi) - m[2] * math.sin(phi)
+            psi_ = math.atan2(Yh, Xh)
+            if self.psi_0 is None:
+                self.psi_0 = psi_
+            psi = -((((psi_ + math.pi) - self.psi_0) % (2 * math.pi)) - math.pi)
+            theta = -theta
+        return _from_euler(psi, theta, phi)
+
+    def _step(self, w_1, w_2, w_3, z0, z1, z2, z3):
+        """
+        - One predict/correct step, the same arithmetic as the loop in AdvKalman.filter_isotropic.
+        """
+        h = 0.5 * self.dt
+        x0, x1, x2, x3 = self.x0, self.x1, self.x2, self.x3
+        # Predict state, x_p = A @ x
+        xp0 = x0 + h * (-w_1 * x1 - w_2 * x2 - w_3 * x3)
+        xp1 = x1 + h * (w_1 * x0 + w_3 * x2 - w_2 * x3)
+        xp2 = x2 + h * (w_2 * x0 - w_3 * x1 + w_1 * x3)
+        xp3 = x3 + h * (w_3 * x0 + w_2 * x1 - w_1 * x2)
+        # Predict error covariance, A @ P @ A.T + Q
+        p = (1 + h * h * (w_1 * w_1 + w_2 * w_2 + w_3 * w_3)) * self.p + self.q
+
+        if self.correct_mode:
+            k = p / (p + self.r)
+            # Use -x_p if it is closer to the measurement
+            if z0 * xp0 + z1 * xp1 + z2 * xp2 + z3 * xp3 < 0:
+                self.x0, self.x1, self.x2, self.x3 = xp0 + k * (z0 + xp0), xp1 + k * (z1 + xp1), xp2 + k * (z2 + xp2), xp3 + k * (z3 + xp3)
+            else:
+                self.x0, self.x1, self.x2, self.x3 = xp0 + k * (z0 - xp0), xp1 + k * (z1 - xp1), xp2 + k * (z2 - xp2), xp3 + k * (z3 - xp3)
+            p = p - k * p
+        else:
+            self.x0, self.x1, self.x2, self.x3 = xp0, xp1, xp2, xp3
+        self.p = p
+
+    def update(self, w, a, m = None):
+        """
+        - Pushes one sample through the filter.
+        Args:
+            w: Gyroscope sample [w1, w2, w3] in rad/s.
+            a: Accelerometer sample [a1, a2, a3] in m/s^2.
+            m (optional): Magnetometer sample [m1, m2, m3]. Defaults to None.
+        Returns:
+            tuple: The Euler angles (psi, theta, phi) after the update.
+        """
+        z0, z1, z2, z3 = self._measurement(a, m)
+        self._step(w[0], w[1], w[2], z0, z1, z2, z3)
+        return _to_euler(self.x0, self.x1, self.x2, self.x3)
+
+    def update_batch(self, ws, as_, ms = None):
+        """
+        - Pushes a block of samples through the filter, equivalent to calling update for each row.
+        - The measurements are converted to quaternions in one vectorised step before the loop.
+        Args:
+            ws (np.ndarray): Gyroscope data (shape: (n, 3)).
+            as_ (np.ndarray): Accelerometer data (shape: (n, 3)).
+            ms (np.ndarray, optional): Magnetometer data (shape: (n, 3)). Defaults to None.
+        Returns:
+            np.ndarray: Euler angles [psi, theta, phi] after each sample (shape: (n, 3)).
+        """
+        ws = np.asarray(ws, dtype=float)
+        as_ = np.asarray(as_, dtype=float)
+        n = len(ws)
+        if n == 0:
+            return np.empty((0, 3))
+        if self.theta_0 is None or (ms is not None and self.psi_0 is None):
+            # The first sample sets the reference angles
+            self.update(ws[0], as_[0], None if ms is None else ms[0])
+            return np.vstack([self.attitude, self.update_batch(ws[1:], as_[1:], None if ms is None else ms[1:])])
+
+        eulers = measurements(as_, ms, self.theta_0, self.phi_0, self.psi_0)
+        zs_q = Quaternion.from_euler(eulers).tolist()
+        quats = np.empty((n, 4))
+        out = quats.reshape(-1)
+        ws = ws.tolist()
+        for i in range(n):
+            w_1, w_2, w_3 = ws[i]
+            z0, z1, z2, z3 = zs_q[i]
+            self._step(w_1, w_2, w_3, z0, z1, z2, z3)
+            out[4*i:4*i + 4] = self.x0, self.x1, self.x2, self.x3
+        return Quaternion.to_euler(quats)
+
+def measurements(as_, ms, theta_0, phi_0, psi_0):
+    """
+    - AdvKalman.get_attitude_measurment with the reference angles given instead of taken from the first row.
+    Returns:
+        np.ndarray: Euler angles [psi, theta, phi] (shape: (n, 3)).
+    """
+    theta = -np.arcsin(np.clip(as_[:, 0] / g, -1, 1))
+    phi = np.arcsin(np.clip(-as_[:, 1] / (g * np.cos(theta)), -1, 1))
+    theta = theta - theta_0
+    phi = phi - phi_0
+    if ms is None:
+        return np.column_stack([np.zeros_like(theta), theta, phi])
+    Xh = ms[:, 0] * np.cos(theta) + ms[:, 1] * np.sin(theta) * np.sin(phi) + ms[:, 2] * np.sin(theta) * np.cos(phi)
+    Yh = ms[:, 1] * np.cos(phi) - ms[:, 2] * np.sin(phi)
+    psi = (((np.arctan2(Yh, Xh) + np.pi) - psi_0) % (2 * np.pi)) - np.pi
+    return np.column_stack([-psi, -theta, phi])
+
+def _from_euler(psi, theta, phi):
+    """
+    - Scalar version of Quaternion.from_euler (extrinsic zyx).
+    """
+    c_psi, s_psi = math.cos(psi / 2), math.sin(psi / 2)
+    c_theta, s_theta = math.cos(theta / 2), math.sin(theta / 2)
+    c_phi, s_phi = math.cos(phi / 2), math.sin(phi / 2)
+    return (c_phi * c_theta * c_psi - s_phi * s_theta * s_psi,
+            s_phi * c_theta * c_psi + c_phi * s_theta * s_psi,
+            c_phi * s_theta * c_psi - s_phi * c_theta * s_psi,
+            c_phi * c_theta * s_psi + s_phi * s_theta * c_psi)
+
+def _to_euler(q0, q1, q2, q3):
+    """
+    - Scalar version of Quaternion.to_euler.
+    """
+    psi = math.atan2(2*(q1*q2+q0*q3),q0*q0+q1*q1-q2*q2-q3*q3)
+    phi = math.atan2(2*(q2*q3+q0*q1),q0*q0-q1*q1-q2*q2+q3*q3)
+    sin_theta = -2 * (q1 * q3 - q0 * q2)
+    if sin_theta > 1:
+        theta = math.pi/2 - math.asin(2 - sin_theta)
+    elif sin_theta < -1:
+        theta = -math.pi/2 + math.asin(2 + sin_theta)
+    else:
+        theta = math.asin(sin_theta)
+    theta = (theta - math.pi/2) % math.pi - math.pi/2  # Normalize to [-pi/2, pi/2]
+    return psi, theta, phi
@@ -2,9 +2,18 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.signal import savgol_filter
 from matplotlib.widgets import Slider
 
+import Files
+import RecursiveFilter
+import ResultCache
+import SavitzkyGolay
+import SensorLogger
+import Stages
+
+
+# Results are saved in .cache/results so repeat runs with the same data and parameters load them instead
+cache = ResultCache.ResultCache()
 
 # 10 colors inspired by plasma colormap (purple -> pink -> yellow progression)
 colors = ['black', 'gold', 'darkorange', 'orangered', 'red', 'crimson',
@@ -45,15 +54,11 @@ def EMALowPass(signal, alpha): # Exponential Moving Average Low Pass
     Args:
         signal (list): The signal to be filtered.
         alpha (float): The smoothing factor determines how quickly weightings of previous terms decay (exponentially)
+    Returns:
+        filtered_signal (np.ndarray): The low pass filtered signal.
     """
-    m_prev = signal[0]
-    filtered_signal = [m_prev]
-    
-    for m in signal:
-        m_new = alpha * m_prev + (1 - alpha) * m
-        filtered_signal.append(m_new)
-        m_prev = m_new
-    return filtered_signal[1:]
+    filtered_signal, _ = RecursiveFilter.low_pass(signal, alpha)
+    return filtered_signal
 
 def EMAHighPass(signal, alpha): # Exponential Moving Average High Pass
     """
@@ -62,16 +67,10 @@ def EMAHighPass(signal, alpha): # Exponential Moving Average High Pass
         signal (list): The signal to be filtered.
         alpha (float): The smoothing factor determines how quickly weightings of previous terms decay (exponentially)
     Returns:
-        filtered_signal (list): The high pass filtered signal.
+        filtered_signal (np.ndarray): The high pass filtered signal.
     """
-    m_prev = signal[0]
-    filtered_signal = [m_prev]
-    
-    for i in range(1, len(signal)):
-        m_new = alpha * (m_prev + signal[i] - signal[i-1])
-        filtered_signal.append(m_new)
-        m_prev = m_new
-    return filtered_signal      
+    filtered_signal, _ = RecursiveFilter.high_pass(signal, alpha)
+    return filtered_signal
      
 def calculate_magnetometer_angle(m, c=20):
     """
@@ -148,8 +147,8 @@ class AnalysePhone(): #
     """
     def __init__(self, FolderName, Saved_Params = None, **kalman_kwargs):
         """
-        - Reads Gravity, Gyroscope, Magnetometer and Orientation data from a files
-        - Puts this data into a single pandas dataframe
+        - Reads Gyroscope, Magnetometer and Orientation data from a files
+        - Aligns this data onto the gyroscope timestamps
         - saves the data as attributes of the object.
         Args:
             FolderName (str): Name of the folder containing the sensor data files.
@@ -181,62 +180,33 @@ class AnalysePhone(): #
             self.R = float(df_params.loc['R'].values[0])
             self.R_m = float(df_params.loc['R_u'].values[0])
         
-        # get accelarometer data in x,y,z directions
-        # Columns are time, x, y, z, seconds_elapsed
-        df_a = pd.read_csv("SensorLoggerData/" + FolderName + "/Gravity.csv", header=0)
-        # get gyroscope data in x,y,z directions
-        # Columns are time, x, y, z, seconds_elapsed
-        df_w = pd.read_csv("SensorLoggerData/" + FolderName + "/Gyroscope.csv", header=0)
-        # Get magnetometer data in x,y,z directions
-        # Columns are time, x, y, z, seconds_elapsed
-        df_m = pd.read_csv("SensorLoggerData/" + FolderName + "/Magnetometer.csv", header=0)
-        # Get true orientation data in yaw pitch, roll.
-        # Columns are time, yaw, pitch, roll, seconds_elapsed
-        df_o = pd.read_csv("SensorLoggerData/" + FolderName + "/Orientation.csv", header=0)
-        
-        # drop time use seconds_elapsed instead
-        df_a.drop(columns=['time'], inplace=True)
-        # rename columns to a_x, a_y, a_z for accelerometer data
-        df_a = df_a.rename(columns={'x': 'a_x', 'y': 'a_y', 'z': 'a_z'})
-        
-        df_w.drop(columns=['time'], inplace=True)
-        df_w = df_w.rename(columns={'x': 'w_x', 'y': 'w_y', 'z': 'w_z'})
-        
-        df_m.drop(columns=['time'], inplace=True)
-        df_m = df_m.rename(columns={'x': 'm_x', 'y': 'm_y', 'z': 'm_z'})
-        
-        df_o.drop(columns=['time'], inplace=True)
-        
-        # Merge dataframes based on nearest seconds_elapsed value, since seconds elapsed isn't the same for each sensor
-        # This is done using pd.merge_asof which merges on the nearest key rather than exact matches.
+        # Gyroscope and Magnetometer have the columns x, y, z. Orientation has yaw, pitch, roll.
+        folder = "SensorLoggerData/" + FolderName
+        names = ["Gyroscope", "Magnetometer", "Orientation"]
+        columns = {"Orientation": ["yaw"]}
+        
+        # Align every sensor to the gyroscope timestamps using the nearest seconds_elapsed value, since seconds elapsed isn't the same for each sensor
         # Done so that when saved the index of each array will match a specific time.
-        # Only merged if within 0.01 seconds
-        df_merged = pd.merge_asof(df_w, df_m, on='seconds_elapsed', tolerance=0.01)
-        df_merged = pd.merge_asof(df_merged, df_o, on='seconds_elapsed', tolerance=0.01)
-        df_merged.dropna(inplace=True)
+        # Timestamps where any sensor has no sample within 0.01 seconds are dropped, the number dropped is in alignment_report
+        # The aligned sensors are cached, they are only read and aligned again if one of the files changes
+        paths = [SensorLogger.find_source(folder, name) for name in names]
+        sources = [(path, Files.fingerprint(path)) for path in paths]
+        self.t, aligned, self.alignment_report = cache.compute(
+            "align", lambda: SensorLogger.align(SensorLogger.read_sensors(folder, names), columns=columns, reference="Gyroscope", tolerance=0.01),
+            sources, columns, "Gyroscope", 0.01, ResultCache.code_version(SensorLogger))
         
-        # Retrieves the time, angular velocity, acceleration and magnetometer data from the merged dataframe
         # Saves data as attributes of the object
-        self.t = df_merged['seconds_elapsed'].values
         self.dt = np.diff(self.t).mean()
-        self.w = df_merged['w_z'].values
-        self.m = np.column_stack([df_merged['m_x'], df_merged['m_y'], df_merged['m_z']])
+        self.w = aligned["Gyroscope"][:, 2]
+        self.m = aligned["Magnetometer"]
+        yaw = aligned["Orientation"][:, 0]
         # pitch and roll are swapped for the phones real data
-        offset = df_merged['yaw'][:self.c].mean()
-        self.theta_phone = -(((df_merged['yaw'] - offset) + np.pi) % (2 * np.pi) - np.pi)
+        offset = yaw[:self.c].mean()
+        self.theta_phone = -(((yaw - offset) + np.pi) % (2 * np.pi) - np.pi)
 
-        # Integrate to calcualte theta
-        self.theta_integrated = integrate_for_theta(self.dt, self.w, self.dt)
-        # Calculate magnetometer angle
-        self.theta_magnetometer = calculate_magnetometer_angle(self.m)
-        # Kalman filter on data
-        self.theta_kalman, self.theta_kalman_var = kalman_filter(self.theta_magnetometer, self.w, B = self.dt, Q = self.Q, R = self.R, R_u = self.R_m, **kalman_kwargs)
-        # LowPass filter on integrated data
-        self.theta_integrated_HP = EMAHighPass(self.theta_integrated, self.alpha_EMAHP)
-        # LowPass filter on magnetometer data
-        self.theta_magnetometer_LP = EMALowPass(self.theta_magnetometer, self.alpha_EMALP)
-        # salvgov filter on magnetometer data
-        self.theta_magnetometer_sav = savgol_filter(self.theta_magnetometer, window_length=self.window_length, polyorder=self.poly_order)
+        self.kalman_kwargs = kalman_kwargs
+        self.stages = self._stages()
+        self._filter()
         
         # Create a list of filtered data for plotting
         self.filtered_data = [self.theta_phone, self.theta_magnetometer, self.theta_magnetometer_LP,
@@ -244,6 +214,56 @@ class AnalysePhone(): #
         self.filtered_data_names = ['Built in Filter', 'Magn, None', 'Magn, EMALPF',
                                     'Gyro, None', 'Gyro, EMAHPF', 'Fusion, KF', 'Magn, SGF']
         
+    def _stages(self):
+        """
+        - The graph of the filter stages, each only reads the data and parameters it depends on
+          so moving a slider only recalculates the stages downstream of it e.g. Q only runs the Kalman filter again.
+        Args:
+            None
+        Returns:
+            Stages.Stages: The stages "integrate", "magnetometer", "kalman", "EMAHighPass", "EMALowPass" and "savgol".
+        """
+        stages = Stages.Stages(cache)
+        stages.add("integrate", lambda w, dt: integrate_for_theta(dt, w, dt), ["w", "dt"], ResultCache.code_version(integrate_for_theta))
+        stages.add("magnetometer", lambda m: calculate_magnetometer_angle(m), ["m"],
+                   ResultCache.code_version(calculate_magnetometer_angle, normalise_angle))
+        stages.add("kalman", lambda magnetometer, w, dt, Q, R, R_m, kalman_kwargs: tuple(
+                       np.asarray(x) for x in kalman_filter(magnetometer, w, B = dt, Q = Q, R = R, R_u = R_m, **kalman_kwargs)),
+                   ["magnetometer", "w", "dt", "Q", "R", "R_m", "kalman_kwargs"], ResultCache.code_version(kalman_filter, diff, normalise_angle))
+        stages.add("EMAHighPass", lambda integrate, alpha_EMAHP: EMAHighPass(integrate, alpha_EMAHP), ["integrate", "alpha_EMAHP"],
+                   ResultCache.code_version(EMAHighPass, RecursiveFilter))
+        stages.add("EMALowPass", lambda magnetometer, alpha_EMALP: EMALowPass(magnetometer, alpha_EMALP), ["magnetometer", "alpha_EMALP"],
+                   ResultCache.code_version(EMALowPass, RecursiveFilter))
+        stages.add("savgol", lambda magnetometer, window_length, poly_order: SavitzkyGolay.smooth(magnetometer, window_length, poly_order),
+                   ["magnetometer", "window_length", "poly_order"], ResultCache.code_version(SavitzkyGolay))
+        stages.set(w=self.w, m=self.m, dt=self.dt, kalman_kwargs=self.kalman_kwargs)
+        return stages
+        
+    def _filter(self):
+        """
+        - Calculates theta with each filter method using the current parameters.
+        - Only the stages whose parameters have changed since the last call are recalculated, see _stages.
+        - Each result is loaded from the results cache if the same data has been filtered with the same parameters before.
+        Args:
+            None
+        Returns:
+            None
+        """
+        self.stages.set(Q=self.Q, R=self.R, R_m=self.R_m, alpha_EMAHP=self.alpha_EMAHP, alpha_EMALP=self.alpha_EMALP,
+                        window_length=self.window_length, poly_order=self.poly_order)
+        # Integrate to calcualte theta
+        self.theta_integrated = self.stages.get("integrate")
+        # Calculate magnetometer angle
+        self.theta_magnetometer = self.stages.get("magnetometer")
+        # Kalman filter on data
+        self.theta_kalman, self.theta_kalman_var = self.stages.get("kalman")
+        # HighPass filter on integrated data
+        self.theta_integrated_HP = self.stages.get("EMAHighPass")
+        # LowPass filter on magnetometer data
+        self.theta_magnetometer_LP = self.stages.get("EMALowPass")
+        # salvgov filter on magnetometer data
+        self.theta_magnetometer_sav = self.stages.get("savgol")
+        
     def calculate_correlation_matrix(self):
         """
         Calculates the correlation matrix between each filter method.
@@ -421,19 +441,7 @@ class AnalysePhone(): #
         self.window_length = int(self.s_window_length.val)
         self.poly_order = int(self.s_poly_order.val)
         
-        # Integrate to calcualte theta
-        self.theta_integrated = integrate_for_theta(self.dt, self.w, self.dt)
-        # Calculate magnetometer angle
-        self.theta_magnetometer = calculate_magnetometer_angle(self.m)
-        # Kalman filter on data
-        self.theta_kalman, self.theta_kalman_var = kalman_filter(self.theta_magnetometer, self.w, B = self.dt,
-                                                                 Q = self.Q, R = self.R, R_u = self.R_m, **kalman_kwargs)
-        # LowPass filter on integrated data
-        self.theta_integrated_HP = EMAHighPass(self.theta_integrated, self.alpha_EMAHP)
-        # LowPass filter on magnetometer data
-        self.theta_magnetometer_LP = EMALowPass(self.theta_magnetometer, self.alpha_EMALP)
-        # salvgov filter on integrated data
-        self.theta_magnetometer_sav = savgol_filter(self.theta_magnetometer, window_length=self.window_length, polyorder=self.poly_order)
+        self._filter()
         
         self.filtered_data = [self.theta_phone, self.theta_magnetometer, self.theta_magnetometer_LP,
                               self.theta_integrated, self.theta_integrated_HP, self.theta_kalman, self.theta_magnetometer_sav]
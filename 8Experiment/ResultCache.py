@@ -0,0 +1,194 @@
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+import Files
+
+# Persistent cache for the results of each stage of an analysis, e.g. the aligned sensors or the Kalman filter output.
+# A result is stored under a key which is a hash of everything it depends on: the stage's name, the contents of its
+# input arrays (or the fingerprint of its input files), its parameters and the source code that calculates it.
+# Nothing is ever invalidated, a change to any of these gives a new key, and the least recently used results are
+# deleted once the cache is larger than max_bytes.
+# Results are arrays, or tuples, lists and dicts of arrays and plain values, stored as uncompressed .npz files.
+
+CACHE_DIR = os.path.join(".cache", "results")
+MAX_BYTES = 2**28  # 256 MB
+
+def code_version(*sources):
+    """
+    - Hash of the source code of modules or functions, so results are recalculated whenever the code that made them changes.
+    Args:
+        *sources: Modules e.g. AdvKalman, functions, or paths to source files.
+    Returns:
+        str: The hash.
+    """
+    h = hashlib.sha1()
+    for source in sources:
+        if inspect.isfunction(source):
+            h.update(inspect.getsource(source).encode())
+            continue
+        path = source if isinstance(source, str) else source.__file__
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _update(h, value):
+    """
+    Adds a value to a hash, arrays by their contents and containers item by item.
+    """
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update(f"array{value.dtype.str}{value.shape}".encode())
+        h.update(value.view(np.uint8).reshape(-1) if value.size else b"")
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for k in sorted(value, key=str):
+            h.update(repr(k).encode())
+            _update(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update(h, item)
+    else:
+        h.update(repr(value).encode())
+
+def key(stage, *parts):
+    """
+    - Key for a result, a hash of the stage's name and everything it depends on.
+    Args:
+        stage (str): Name of the stage e.g. "kalman".
+        *parts: Inputs, parameters and code versions. Arrays are hashed by their contents.
+    Returns:
+        str: The key.
+    """
+    h = hashlib.sha1(stage.encode())
+    _update(h, parts)
+    return h.hexdigest()
+
+def _flatten(value, arrays):
+    """
+    Splits a result into its arrays and a json description of its structure.
+    """
+    if isinstance(value, np.ndarray):
+        arrays.append(np.asarray(value))
+        return {"array": len(arrays) - 1}
+    if isinstance(value, tuple):
+        return {"tuple": [_flatten(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return {"list": [_flatten(item, arrays) for item in value]}
+    if isinstance(value, dict):
+        return {"dict": [[k, _flatten(v, arrays)] for k, v in value.items()]}
+    if isinstance(value, np.generic):
+        value = value.item()
+    return {"value": value}
+
+def _unflatten(structure, arrays):
+    """
+    Rebuilds a result from its arrays and structure.
+    """
+    if "array" in structure:
+        return arrays[f"a{structure['array']}"]
+    if "tuple" in structure:
+        return tuple(_unflatten(item, arrays) for item in structure["tuple"])
+    if "list" in structure:
+        return [_unflatten(item, arrays) for item in structure["list"]]
+    if "dict" in structure:
+        return {k: _unflatten(v, arrays) for k, v in structure["dict"]}
+    return structure["value"]
+
+class ResultCache:
+    """
+    - Folder of results, each in its own .npz file named by its key.
+    - A file's modification time is when it was last used, the oldest are deleted first when the cache is too large.
+    """
+    def __init__(self, folder = CACHE_DIR, max_bytes = MAX_BYTES):
+        """
+        Args:
+            folder (str): Folder the results are saved in. Defaults to .cache/results.
+            max_bytes (int): Largest total size of the results. Defaults to 256 MB.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.npz")
+
+    def load(self, key):
+        """
+        Returns:
+            The result saved under key, None if there isn't one.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                arrays = {name: f[name] for name in f.files}
+            os.utime(path)  # Most recently used
+        except (OSError, ValueError, KeyError):
+            return None
+        return _unflatten(json.loads(str(arrays.pop("structure"))), arrays)
+
+    def save(self, key, value):
+        """
+        Saves a result under key, then deletes the least recently used results if the cache is too large.
+        """
+        arrays = []
+        structure = _flatten(value, arrays)
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+        Files.atomic_write(path, lambda f: np.savez(f, structure=np.array(json.dumps(structure)),
+                                                    **{f"a{i}": array for i, array in enumerate(arrays)}))
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used results until the cache is at most max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def compute(self, stage, function, *parts):
+        """
+        - Loads the stage's result if it has been saved, otherwise calculates it with function() and saves it.
+        Args:
+            stage (str): Name of the stage e.g. "kalman".
+            function (callable): Calculates the result, called with no arguments.
+            *parts: Everything the result depends on, see key.
+        Returns:
+            The result.
+        """
+        k = key(stage, *parts)
+        value = self.load(k)
+        if value is None:
+            self.misses += 1
+            value = function()
+            self.save(k, value)
+        else:
+            self.hits += 1
+        return value
+
+    def clear(self):
+        """
+        Deletes every result.
+        """
+        if not os.path.isdir(self.folder):
+            return
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".npz"):
+                os.remove(entry.path)
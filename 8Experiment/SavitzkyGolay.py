@@ -0,0 +1,127 @@
+import numpy as np
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import correlate1d
+from scipy.signal import savgol_coeffs
+
+# Savitzky-Golay smoothing, a polynomial is fitted to each window of samples by least squares.
+# Signals can have several channels, time is along the last axis (shape: (T,) or (channels, T)).
+
+@lru_cache(maxsize=32)
+def coefficients(window_length, poly_order, deriv = 0):
+    """
+    - Coefficients which evaluate the fitted polynomial (or its derivative) at every position in the window.
+    - Only depends on the shape of the window so it is cached, moving a slider back to a previous value is free.
+    Args:
+        window_length (int): Number of samples in each window, must be odd.
+        poly_order (int): Order of the fitted polynomial, must be less than window_length.
+        deriv (int): Order of the derivative to calculate. Defaults to 0 which smooths the signal.
+    Returns:
+        np.ndarray: Row pos dotted with a window gives the value at sample pos of the window (shape: (window_length, window_length)).
+    """
+    if window_length % 2 == 0:
+        raise ValueError("window_length must be odd")
+    if poly_order >= window_length:
+        raise ValueError("poly_order must be less than window_length")
+    C = np.array([savgol_coeffs(window_length, poly_order, deriv=deriv, pos=pos, use='dot') for pos in range(window_length)])
+    C.flags.writeable = False  # Shared between every caller
+    return C
+
+def smooth(signal, window_length, poly_order, deriv = 0, delta = 1.0):
+    """
+    - Same as scipy.signal.savgol_filter with mode = 'interp', using the cached coefficients.
+    - The middle of each window is used for the interior, the first and last half windows are taken from
+      the polynomials fitted to the first and last windows.
+    Args:
+        signal (np.ndarray): The signal to be smoothed (shape: (T,) or (channels, T)).
+        window_length (int): Number of samples in each window, must be odd and at most T.
+        poly_order (int): Order of the fitted polynomial, must be less than window_length.
+        deriv (int): Order of the derivative to calculate. Defaults to 0 which smooths the signal.
+        delta (float): Spacing of the samples, only used when deriv > 0. Defaults to 1.0.
+    Returns:
+        np.ndarray: The smoothed signal (same shape as signal).
+    """
+    signal = np.asarray(signal, dtype=float)
+    if signal.shape[-1] < window_length:
+        raise ValueError("window_length must be less than or equal to the length of the signal")
+    C = coefficients(window_length, poly_order, deriv)
+    half = window_length // 2
+    smoothed = correlate1d(signal, C[half], axis=-1, mode='constant')
+    smoothed[..., :half] = signal[..., :window_length] @ C[:half].T
+    smoothed[..., signal.shape[-1] - half:] = signal[..., -window_length:] @ C[half + 1:].T
+    return smoothed / delta**deriv
+
+class SavitzkyGolay:
+    """
+    - Causal Savitzky-Golay smoother for a live stream, the samples can be pushed in one at a time (update) or in chunks (filter).
+    - When a sample arrives the polynomial is fitted to the last window_length samples and evaluated lag samples back,
+      so each smoothed value is available lag samples after its own sample.
+    - lag = window_length // 2 gives the same values as smooth away from the edges, lag = 0 has no delay.
+    - Only the last window_length samples are kept.
+    """
+    def __init__(self, window_length, poly_order, deriv = 0, lag = None, delta = 1.0, channels = None):
+        """
+        Args:
+            window_length (int): Number of samples in each window, must be odd.
+            poly_order (int): Order of the fitted polynomial, must be less than window_length.
+            deriv (int): Order of the derivative to calculate. Defaults to 0 which smooths the signal.
+            lag (int, optional): Delay in samples, between 0 and window_length - 1. Defaults to window_length // 2.
+            delta (float): Spacing of the samples, only used when deriv > 0. Defaults to 1.0.
+            channels (int, optional): Number of channels. Defaults to None for a single channel signal of shape (T,).
+        """
+        self.window_length = window_length
+        self.lag = window_length // 2 if lag is None else lag
+        if not 0 <= self.lag < window_length:
+            raise ValueError("lag must be between 0 and window_length - 1")
+        self.coefficients = coefficients(window_length, poly_order, deriv)[window_length - 1 - self.lag] / delta**deriv
+        shape = () if channels is None else (channels,)
+        # The samples are written twice so the last window is always a contiguous slice
+        self.buffer = np.zeros(shape + (2 * window_length,))
+        self.count = 0  # Number of samples seen so far
+
+    def update(self, x):
+        """
+        - Adds one sample to the stream.
+        Args:
+            x (float or np.ndarray): The new sample (shape: () or (channels,)).
+        Returns:
+            int: The index of the sample the smoothed value belongs to, None until the first window is full.
+            np.ndarray: The smoothed value, None until the first window is full.
+        """
+        position = self.count % self.window_length
+        self.buffer[..., position] = x
+        self.buffer[..., position + self.window_length] = x
+        self.count += 1
+        if self.count < self.window_length:
+            return None, None
+        window = self.buffer[..., position + 1:position + 1 + self.window_length]
+        return self.count - 1 - self.lag, window @ self.coefficients
+
+    def filter(self, signal):
+        """
+        - Adds a chunk of samples to the stream.
+        Args:
+            signal (np.ndarray): The new samples (shape: (T,) or (channels, T)).
+        Returns:
+            np.ndarray: The index of the sample each smoothed value belongs to.
+            np.ndarray: The smoothed values of every window which ends in this chunk.
+        """
+        signal = np.asarray(signal, dtype=float)
+        n = signal.shape[-1]
+        h = min(self.count, self.window_length - 1)
+        position = self.count % self.window_length
+        history = self.buffer[..., position + self.window_length - h:position + self.window_length]
+        extended = np.concatenate([history, signal], axis=-1)
+        if extended.shape[-1] < self.window_length:
+            values = extended[..., :0]
+        else:
+            values = sliding_window_view(extended, self.window_length, axis=-1) @ self.coefficients
+        indices = self.count - h + np.arange(self.window_length - 1, extended.shape[-1]) - self.lag
+
+        # Keep the last window_length samples
+        k = min(n, self.window_length)
+        positions = (self.count + n - k + np.arange(k)) % self.window_length
+        self.buffer[..., positions] = signal[..., n - k:]
+        self.buffer[..., positions + self.window_length] = signal[..., n - k:]
+        self.count += n
+        return indices, values
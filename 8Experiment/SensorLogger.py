@@ -0,0 +1,400 @@
+import glob
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Files
+
+# Loads sensor streams recorded by the SensorLogger app.
+# Each session folder has one csv per sensor e.g. Gyroscope.csv with the columns time, seconds_elapsed, z, y, x.
+# The first time a sensor is read its columns are saved as .npy files in the folder's .cache directory,
+# later reads memory map these files instead of parsing the csv again.
+# If a folder only has the zip exported by the app the sensors are read straight out of the zip.
+# Sensors are parsed with pyarrow when it is installed, otherwise with pandas' C parser, and several sensors
+# (and sessions) are parsed at once on a thread pool.
+
+CACHE_DIR = ".cache"
+SKIP_COLUMNS = ['time']  # Nanoseconds since the epoch, seconds_elapsed is used for the timestamps
+
+try:
+    import pyarrow  # noqa: F401, only needed for the faster parser
+    ENGINE = "pyarrow"
+except ImportError:
+    ENGINE = "c"
+
+def _read_csv(path, columns = None):
+    """
+    pd.read_csv which returns an empty dataframe for an empty file, e.g. Annotation.csv when nothing was annotated.
+    """
+    try:
+        return pd.read_csv(path, header=0, usecols=columns)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=columns)
+
+def _sensor_columns(f):
+    """
+    Reads the header of an open csv.
+    Returns:
+        list: Every column except SKIP_COLUMNS, None if the file is empty.
+    """
+    header = f.readline()
+    if isinstance(header, bytes):
+        header = header.decode("utf-8")
+    if not header.strip():
+        return None
+    return [column for column in header.strip().split(",") if column not in SKIP_COLUMNS]
+
+def _read_sensor_csv(path, columns = None):
+    """
+    - Parses a sensor's csv with the fastest parser available, every column is read as float64.
+    - Only the requested columns are parsed, by default every column except SKIP_COLUMNS.
+    """
+    if columns is None:
+        with open(path) as f:
+            columns = _sensor_columns(f)
+        if columns is None:
+            return pd.DataFrame()
+    try:
+        return pd.read_csv(path, header=0, usecols=columns, dtype={column: np.float64 for column in columns}, engine=ENGINE)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=columns)
+    except ValueError:
+        # A column which isn't numeric
+        return pd.read_csv(path, header=0, usecols=columns)
+
+def find_zip(folder):
+    """
+    Returns:
+        str: Path to the zip exported by SensorLogger in the folder, None if there isn't one.
+    """
+    zips = sorted(glob.glob(os.path.join(folder, "*.zip")))
+    return zips[0] if zips else None
+
+def iter_sensor_zip(zip_path, sensor, columns = None, chunksize = 2**14):
+    """
+    - Reads one sensor out of a SensorLogger zip without extracting it to disk.
+    - Only the requested member is decompressed, and it is parsed in chunks as it is decompressed.
+    Args:
+        zip_path (str): Path to the zip.
+        sensor (str): Name of the sensor e.g. "Gyroscope".
+        columns (list, optional): Columns to return. Defaults to None which returns every column except SKIP_COLUMNS.
+        chunksize (int): Number of rows in each chunk. Defaults to 2**14.
+    Yields:
+        dict: Column name to array for each chunk of rows.
+    Raises:
+        ValueError: If a column isn't numeric, read_sensor_zip parses the whole sensor without dtypes instead.
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        name = f"{sensor}.csv"
+        if z.getinfo(name).file_size == 0:
+            return
+        if columns is None:
+            with z.open(name) as f:
+                columns = _sensor_columns(f)
+        with z.open(name) as f:
+            dtypes = {column: np.float64 for column in columns}
+            for chunk in pd.read_csv(f, header=0, usecols=columns, dtype=dtypes, chunksize=chunksize):
+                yield {column: chunk[column].values for column in chunk.columns}
+
+def read_sensor_zip(zip_path, sensor, columns = None, chunksize = 2**14):
+    """
+    - Reads one sensor out of a SensorLogger zip, see iter_sensor_zip.
+    Returns:
+        pd.DataFrame: The sensor's columns.
+    """
+    try:
+        chunks = list(iter_sensor_zip(zip_path, sensor, columns=columns, chunksize=chunksize))
+    except ValueError:
+        # A column which isn't numeric, the same fallback as _read_sensor_csv
+        with zipfile.ZipFile(zip_path) as z:
+            name = f"{sensor}.csv"
+            if columns is None:
+                with z.open(name) as f:
+                    columns = _sensor_columns(f)
+            with z.open(name) as f:
+                return pd.read_csv(f, header=0, usecols=columns)
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame({column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0]})
+
+def find_source(folder, sensor):
+    """
+    Returns:
+        str: The sensor's csv if it has been extracted, otherwise the session's zip.
+    """
+    path = os.path.join(folder, f"{sensor}.csv")
+    if os.path.exists(path):
+        return path
+    zip_path = find_zip(folder)
+    if zip_path is None:
+        raise FileNotFoundError(f"No {sensor}.csv or zip in {folder}")
+    return zip_path
+
+def _parse(source, sensor, columns = None):
+    """
+    Parses a file from the session folder or the session's zip, e.g. Metadata.
+    """
+    if source.endswith(".zip"):
+        with zipfile.ZipFile(source) as z:
+            with z.open(f"{sensor}.csv") as f:
+                return _read_csv(f, columns)
+    return _read_csv(source, columns)
+
+def _parse_sensor(source, sensor, columns = None):
+    """
+    Parses a sensor from its csv or the session's zip, every column is read as float64.
+    """
+    if source.endswith(".zip"):
+        return read_sensor_zip(source, sensor, columns=columns)
+    return _read_sensor_csv(source, columns)
+
+def _column_array(series):
+    """
+    - A column as a contiguous array which can be memory mapped.
+    - Anything which isn't a number or a time is a fixed width string, missing values are empty strings.
+    """
+    values = series.to_numpy()
+    if values.dtype.kind not in "biufcmM":
+        values = series.astype(object).fillna("").to_numpy().astype(str)
+    return np.ascontiguousarray(values)
+
+def _write_cache(cache_folder, df, fingerprint):
+    """
+    - Saves each column of the dataframe as its own .npy file.
+    - Text columns (e.g. Battery's state) are saved as fixed width strings, object arrays can't be memory mapped.
+    - Every file is written with Files.atomic_write, and the metadata last so the cache is only used once it is complete.
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    for column in df.columns:
+        values = _column_array(df[column])
+        Files.atomic_write(os.path.join(cache_folder, f"{column}.npy"), lambda f: np.save(f, values))
+    Files.write_json(os.path.join(cache_folder, "meta.json"), dict(fingerprint, columns=list(df.columns)))
+
+def _read_cache(cache_folder, fingerprint):
+    """
+    Returns:
+        list: The cached column names, None if there is no cache or it is out of date.
+    """
+    try:
+        with open(os.path.join(cache_folder, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("size") != fingerprint["size"] or meta.get("mtime_ns") != fingerprint["mtime_ns"]:
+        return None
+    return meta["columns"]
+
+def _load_sensor(folder, sensor, columns = None, cache = True):
+    """
+    - read_sensor, which also says whether the sensor had to be parsed.
+    Returns:
+        dict: Column name to read only array (shape: (n,)).
+        bool: False if the columns were memory mapped from an up to date cache.
+    """
+    source = find_source(folder, sensor)
+    if not cache:
+        df = _parse_sensor(source, sensor, columns)
+        return {column: df[column].values for column in df.columns}, True
+
+    cache_folder = os.path.join(folder, CACHE_DIR, sensor)
+    fingerprint = Files.fingerprint(source)
+    cached_columns = _read_cache(cache_folder, fingerprint)
+    parsed = cached_columns is None
+    if parsed:
+        df = _parse_sensor(source, sensor)
+        _write_cache(cache_folder, df, fingerprint)
+        cached_columns = list(df.columns)
+    if columns is None:
+        columns = cached_columns
+    missing = [column for column in columns if column not in cached_columns]
+    if missing:
+        raise KeyError(f"{sensor} has no columns {missing}")
+    return {column: np.load(os.path.join(cache_folder, f"{column}.npy"), mmap_mode="r") for column in columns}, parsed
+
+def read_sensor(folder, sensor, columns = None, cache = True):
+    """
+    - Reads one sensor from a SensorLogger session folder, from its csv or if that has not been extracted from the zip.
+    - With cache = True the columns are memory mapped from the .npy cache, which is created or rebuilt
+      from the csv if it is missing or the csv's size or modification time has changed.
+    Args:
+        folder (str): Path to the session folder e.g. "SensorLoggerData/PitchRoll".
+        sensor (str): Name of the sensor e.g. "Gyroscope".
+        columns (list, optional): Columns to return. Defaults to None which returns every column except SKIP_COLUMNS.
+        cache (bool): Whether to use the .npy cache. Defaults to True.
+    Returns:
+        dict: Column name to read only array (shape: (n,)).
+    """
+    return _load_sensor(folder, sensor, columns=columns, cache=cache)[0]
+
+def read_sessions(folders, sensors, cache = True, max_workers = None):
+    """
+    - Reads the same sensors from several SensorLogger session folders, every sensor of every session is parsed
+      at the same time on a thread pool.
+    Args:
+        folders (list): Paths to the session folders.
+        sensors (list): Names of the sensors.
+        cache (bool): Whether to use the .npy cache. Defaults to True.
+        max_workers (int, optional): Number of threads. Defaults to None which lets ThreadPoolExecutor choose.
+    Returns:
+        dict: Session folder to a dict of sensor name to a dict of its columns.
+        pd.DataFrame: One row per file with the folder, sensor, number of rows, seconds taken and whether it was parsed
+                      (False if it was memory mapped from the cache).
+    """
+    def load(folder, sensor):
+        start = time.perf_counter()
+        data, parsed = _load_sensor(folder, sensor, cache=cache)
+        rows = len(next(iter(data.values()))) if data else 0
+        return data, {"folder": folder, "sensor": sensor, "rows": rows, "seconds": time.perf_counter() - start, "parsed": parsed}
+
+    jobs = [(folder, sensor) for folder in folders for sensor in sensors]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda job: load(*job), jobs))
+    sessions = {folder: {} for folder in folders}
+    for (folder, sensor), (data, _) in zip(jobs, results):
+        sessions[folder][sensor] = data
+    return sessions, pd.DataFrame([timing for _, timing in results])
+
+def read_sensors(folder, sensors, cache = True, max_workers = None):
+    """
+    - Reads several sensors from a SensorLogger session folder at the same time, see read_sensor and read_sessions.
+    Args:
+        folder (str): Path to the session folder.
+        sensors (list): Names of the sensors.
+        cache (bool): Whether to use the .npy cache. Defaults to True.
+        max_workers (int, optional): Number of threads. Defaults to None which lets ThreadPoolExecutor choose.
+    Returns:
+        dict: Sensor name to a dict of its columns.
+    """
+    return read_sessions([folder], sensors, cache=cache, max_workers=max_workers)[0][folder]
+
+def read_file(folder, name):
+    """
+    - Reads a csv which isn't a sensor from a SensorLogger session folder, or its zip if it hasn't been extracted.
+    Args:
+        folder (str): Path to the session folder.
+        name (str): Name of the file e.g. "Metadata" or "Annotation".
+    Returns:
+        pd.DataFrame: The file's columns, empty if the file is empty.
+    """
+    return _parse(find_source(folder, name), name)
+
+def read_annotations(folder):
+    """
+    Returns:
+        np.ndarray: Times in seconds of the annotations in the session's Annotation.csv, empty if there are none.
+    """
+    try:
+        df = read_file(folder, "Annotation")
+    except FileNotFoundError:
+        return np.empty(0)
+    if 'seconds_elapsed' not in df.columns:
+        return np.empty(0)
+    return np.sort(df['seconds_elapsed'].to_numpy(dtype=float))
+
+def read_metadata(folder):
+    """
+    - Reads the sample rate of each sensor from the session's Metadata.csv.
+    Args:
+        folder (str): Path to the session folder.
+    Returns:
+        dict: Sensor name to its sample period in milliseconds, None if the app didn't record one.
+    """
+    df = read_file(folder, "Metadata")
+    sensors = str(df['sensors'].iloc[0]).split('|')
+    rates = str(df['sampleRateMs'].iloc[0]).split('|')
+    return {sensor: float(rate) if rate else None for sensor, rate in zip(sensors, rates)}
+
+def _default_columns(data):
+    """
+    The x, y, z columns if the sensor has them, otherwise every column except the timestamps.
+    """
+    if all(axis in data for axis in ('x', 'y', 'z')):
+        return ['x', 'y', 'z']
+    return [column for column in data if column not in ('time', 'seconds_elapsed')]
+
+def align(sensors, columns = None, reference = None, sample_rate_ms = None, method = "nearest", tolerance = 0.01):
+    """
+    - Puts several sensor streams onto one time grid in a single pass, each stream is looked up with np.searchsorted.
+    - The grid is either the reference sensor's timestamps or evenly spaced every sample_rate_ms over the time
+      all the sensors were recording.
+    - A grid point is kept only if every sensor has a sample within tolerance of it, the number of points each sensor
+      caused to be dropped is reported rather than lost silently.
+    Args:
+        sensors (dict): Sensor name to a dict of its columns, as returned by read_sensor. Each needs 'seconds_elapsed'.
+        columns (dict, optional): Sensor name to the columns to align. Defaults to x, y, z (or every column except the
+                                  timestamps if the sensor doesn't have x, y, z).
+        reference (str, optional): Sensor whose timestamps are used as the grid. Defaults to the first sensor.
+        sample_rate_ms (float, optional): Spacing of an evenly spaced grid in milliseconds e.g. from read_metadata.
+                                          Overrides reference.
+        method (str): "nearest" takes the closest sample, "linear" interpolates between the samples either side.
+                      Angles which wrap around at ±pi should use "nearest". Defaults to "nearest".
+        tolerance (float): Largest gap in seconds between a grid point and the closest sample. Defaults to 0.01.
+    Returns:
+        np.ndarray: The grid times in seconds (shape: (n,)).
+        dict: Sensor name to its aligned columns as a contiguous array (shape: (n, number of columns)).
+        dict: Sensor name to {'dropped': grid points it had no sample for,
+                              'interpolated': grid points which didn't fall exactly on one of its samples}.
+    Raises:
+        ValueError: If a sensor has no samples, e.g. its csv is empty.
+    """
+    if method not in ("nearest", "linear"):
+        raise ValueError("method must be 'nearest' or 'linear'")
+    names = list(sensors)
+    columns = {} if columns is None else columns
+    for name in names:
+        if len(sensors[name].get('seconds_elapsed', ())) == 0:
+            raise ValueError(f"{name} has no samples to align")
+    times = {name: np.asarray(sensors[name]['seconds_elapsed'], dtype=float) for name in names}
+    if sample_rate_ms is not None:
+        start = max(t[0] for t in times.values())
+        stop = min(t[-1] for t in times.values())
+        grid = np.arange(start, stop + 1e-12, sample_rate_ms / 1000)
+    else:
+        grid = times[names[0] if reference is None else reference]
+
+    # Index of the sample at or before each grid point and the one after it
+    valid = np.ones(len(grid), dtype=bool)
+    lookups = {}
+    for name in names:
+        t = times[name]
+        if len(t) == 1:
+            # The only sample is both before and after every grid point
+            after = before = np.zeros(len(grid), dtype=np.intp)
+        else:
+            after = np.clip(np.searchsorted(t, grid), 1, len(t) - 1)
+            before = after - 1
+        gap_before = grid - t[before]
+        gap_after = t[after] - grid
+        if method == "nearest":
+            nearest = np.where(gap_after < np.abs(gap_before), after, before)
+            ok = np.abs(t[nearest] - grid) <= tolerance
+            lookups[name] = (nearest, ok, t[nearest] != grid)
+        else:
+            # Either side of the grid point, or on the first or last sample
+            inside = (gap_before >= 0) & (gap_after >= 0)
+            ok = inside & (np.minimum(gap_before, gap_after) <= tolerance)
+            lookups[name] = (before, ok, (gap_before != 0) & (gap_after != 0))
+        valid &= ok
+
+    aligned = {}
+    report = {}
+    for name in names:
+        index, ok, off_grid = lookups[name]
+        index = index[valid]
+        cols = columns.get(name, _default_columns(sensors[name]))
+        values = np.column_stack([np.asarray(sensors[name][column], dtype=float) for column in cols])
+        if method == "nearest":
+            aligned[name] = np.ascontiguousarray(values[index])
+        else:
+            t = times[name]
+            upper = np.minimum(index + 1, len(t) - 1)
+            span = t[upper] - t[index]
+            weight = ((grid[valid] - t[index]) / np.where(span > 0, span, 1))[:, np.newaxis]
+            aligned[name] = (1 - weight) * values[index] + weight * values[upper]
+        report[name] = {'dropped': int(np.count_nonzero(~ok)), 'interpolated': int(np.count_nonzero(off_grid[valid]))}
+    return grid[valid].copy(), aligned, report
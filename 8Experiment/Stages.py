@@ -0,0 +1,78 @@
+import ResultCache
+
+# Dependency graph of the stages of an interactive analysis, so moving a slider only recalculates what depends on it.
+# Parameters (the data, q, r, ...) are set by name and each stage is a function of the parameters and other stages it reads.
+# A stage's key is a hash of its name, the keys of its inputs and its code version, the latest result of each stage is kept
+# in memory with its key and is only recalculated when the key changes. With a ResultCache results are also saved to disk,
+# so a slider moved back to an earlier value or a rerun of the script loads them instead.
+
+class Stages:
+    """
+    - Graph of named parameters and the stages calculated from them e.g.
+      stages.add("kalman", fuse, ["w", "measurements", "q", "r"]), then stages.set(q=0.1) and stages.get("kalman").
+    - Stages are calculated lazily by get, only the stages whose inputs have changed since they were last calculated are run.
+    """
+    def __init__(self, cache = None):
+        """
+        Args:
+            cache (ResultCache.ResultCache, optional): Where results are saved between runs. Defaults to None, memory only.
+        """
+        self.cache = cache
+        self.parameters = {}  # Name to (key, value)
+        self.stages = {}  # Name to (function, inputs, version, persist)
+        self.results = {}  # Name to (key, result) of the latest result
+        self.runs = {}  # Name to the number of times the stage was calculated or loaded from the cache
+
+    def add(self, name, function, inputs, version = None, persist = True):
+        """
+        - Adds a stage to the graph, its inputs must be parameters or stages which have already been added.
+        Args:
+            name (str): Name of the stage e.g. "kalman".
+            function (callable): Calculates the result, called with each input as a keyword argument.
+            inputs (list): Names of the parameters and stages the function reads.
+            version (str, optional): Version of the code, see ResultCache.code_version.
+            persist (bool): Whether the result is saved in the cache. Defaults to True.
+        """
+        self.stages[name] = (function, list(inputs), version, persist)
+        self.results.pop(name, None)
+
+    def set(self, **values):
+        """
+        - Sets parameters, stages which read a parameter are recalculated by the next get only if its value has changed.
+        - Arrays are hashed here once, rather than every time a stage is checked.
+        """
+        for name, value in values.items():
+            self.parameters[name] = (ResultCache.key("parameter", value), value)
+
+    def key(self, name):
+        """
+        Returns:
+            str: Hash of a parameter's value, or of a stage's name, version and the keys of its inputs.
+        """
+        if name in self.parameters:
+            return self.parameters[name][0]
+        function, inputs, version, persist = self.stages[name]
+        return ResultCache.key(name, [self.key(i) for i in inputs], version)
+
+    def get(self, name):
+        """
+        - Value of a parameter, or the result of a stage which is only calculated if one of its inputs has changed.
+        Returns:
+            The value or result.
+        """
+        if name in self.parameters:
+            return self.parameters[name][1]
+        function, inputs, version, persist = self.stages[name]
+        k = self.key(name)
+        latest = self.results.get(name)
+        if latest is not None and latest[0] == k:
+            return latest[1]
+        # The inputs are only calculated if the result isn't in the cache
+        calculate = lambda: function(**{i: self.get(i) for i in inputs})
+        if self.cache is not None and persist:
+            result = self.cache.compute(name, calculate, k)
+        else:
+            result = calculate()
+        self.results[name] = (k, result)
+        self.runs[name] = self.runs.get(name, 0) + 1
+        return result
@@ -2,6 +2,14 @@
 
 #define MPU_ADDRESS 0x68 //  mpu6050 address is 0x69 if AD0 pin is powered -  otherwise it's 0x68
 
+// 0 prints each sample as a line of text t/gx/gy/gz/ax/ay/az/temp (about 60 bytes)
+// 1 sends each sample as a 21 byte binary frame, decoded by FrameDecoder in 7IMUReal/SerialReader.py
+#define BINARY_MODE 0
+
+#define SYNC_1 0xA5 // every frame starts with these two bytes
+#define SYNC_2 0x5A
+#define FRAME_SIZE 21 // 2 sync bytes + uint32 millis + 7 int16 readings + 1 checksum byte
+
 float gX, gY, gZ; // initialise gyroscope variables
 float aX, aY, aZ; // initialise accelerometer variables
 float temp; // initialise temperature variables
@@ -9,13 +17,51 @@ float temp; // initialise temperature variables
 void setup(){
     Serial.begin(115200); // begin serial communication at 115200 baud
     wakeSensor(MPU_ADDRESS); // wakes sensor from sleep mode
+#if !BINARY_MODE
     Serial.println("t/gx/gy/gz/ax/ay/az/temp");
+#endif
+}
+
+void writeInt16(uint8_t *frame, int &i, float value){
+    // the readings are raw counts so they fit in an int16, written little endian
+    int16_t v = (int16_t)value;
+    frame[i++] = v & 0xFF;
+    frame[i++] = (v >> 8) & 0xFF;
+}
+
+void sendFrame(){
+    uint8_t frame[FRAME_SIZE];
+    int i = 0;
+    frame[i++] = SYNC_1;
+    frame[i++] = SYNC_2;
+    uint32_t t = millis();
+    frame[i++] = t & 0xFF;
+    frame[i++] = (t >> 8) & 0xFF;
+    frame[i++] = (t >> 16) & 0xFF;
+    frame[i++] = (t >> 24) & 0xFF;
+    writeInt16(frame, i, gX);
+    writeInt16(frame, i, gY);
+    writeInt16(frame, i, gZ);
+    writeInt16(frame, i, aX);
+    writeInt16(frame, i, aY);
+    writeInt16(frame, i, aZ);
+    writeInt16(frame, i, temp);
+    // checksum is the sum of every byte after the sync bytes, modulo 256
+    uint8_t checksum = 0;
+    for (int j = 2; j < FRAME_SIZE - 1; j++){
+        checksum += frame[j];
+    }
+    frame[i++] = checksum;
+    Serial.write(frame, FRAME_SIZE);
 }
 
 void loop(){
     readGyroData(MPU_ADDRESS , gX, gY, gZ); // pass MPU6050 address and gyroscope values are written to 3 provided variables
     readAccelData(MPU_ADDRESS, aX, aY, aZ); // pass MPU6050 address and accelerometer values are written to 3 provided variables
     readTempData(MPU_ADDRESS, temp); // pass MPU6050 address and temperature values are written to 3 provided variables
+#if BINARY_MODE
+    sendFrame(); // 21 bytes take under 2 ms at 115200 baud so no delay is needed
+#else
     Serial.print(millis());
     Serial.print("/");
     Serial.print(gX);
@@ -32,4 +78,5 @@ void loop(){
     Serial.print("/");
     Serial.println(temp);
     delay(10);
-}
\ No newline at end of file
+#endif
+}